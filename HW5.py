@@ -1,12 +1,19 @@
 #programmer: Reid Reininger(charles.reininger@wsu.edu)
 #date: 11/7/18
 #desc: Intended for Unix/Linux Systems. Interpreter for Simplified
-#      Postscript(SPS). Part2. Part2 code begins at line 272. Part2 test
-#      functions begin at line 821.
+#      Postscript(SPS). Part2. Part2 code begins at the "Part 2" section.
+#      Part2 test functions begin at the "PART2 TEST CASES" section.
 
 #to check for iterable object types
 from collections.abc import Iterable
+#to evict the least recently used results of memoized procedures
+from collections import OrderedDict
 import re
+#python versions of the arithmetic operators for specialized handlers
+import operator
+import sys
+#typed storage for the unboxed operand stack
+from array import array as typedArray
 
 #globals
 opstack = []
@@ -32,40 +39,227 @@ def opPopn(n):
     else:
         print('error: not enough items in opstack')
 
+#kinds of the items of a NumStack, an index into its stores
+OBJECT = 0
+INT = 1
+FLOAT = 2
+BOOL = 3
+
+#ints outside this range are kept as objects
+maxInt = 2**63 - 1
+
+def numKind(value):
+    """Return the kind of store a NumStack keeps value in."""
+    t = type(value)
+    if t is int:
+        return INT if -maxInt <= value <= maxInt else OBJECT
+    elif t is float:
+        return FLOAT
+    elif t is bool:
+        return BOOL
+    return OBJECT
+
+class NumStack:
+    """Operand stack keeping ints, floats and bools unboxed in typed arrays.
+
+       tags holds the kind of each item, bottom first, and each kind has its
+       own stack in stores, so plain numbers are not kept as objects and any
+       other value goes on a list. It can stand in for the opstack list."""
+    __slots__ = ('tags', 'stores')
+
+    def __init__(self, items=()):
+        self.tags = bytearray()
+        self.stores = ([], typedArray('q'), typedArray('d'), bytearray())
+        self.extend(items)
+
+    def locate(self, i):
+        """Return the kind of item i, its store and its index in the store."""
+        tags = self.tags
+        if i < 0:
+            i += len(tags)
+        if not 0 <= i < len(tags):
+            raise IndexError('list index out of range')
+        kind = tags[i]
+        store = self.stores[kind]
+        #the items of the same kind above item i are at the end of the store
+        return kind, store, len(store) - 1 - tags.count(kind, i + 1)
+
+    def append(self, value):
+        kind = numKind(value)
+        self.tags.append(kind)
+        self.stores[kind].append(value)
+
+    def pop(self):
+        kind = self.tags.pop()
+        value = self.stores[kind].pop()
+        return bool(value) if kind == BOOL else value
+
+    def extend(self, values):
+        for x in values:
+            self.append(x)
+
+    def clear(self):
+        self.tags.clear()
+        for store in self.stores:
+            del store[:]
+
+    def truncate(self, n):
+        """Remove all items but the bottom n."""
+        for kind, store in enumerate(self.stores):
+            above = self.tags.count(kind, n)
+            if above:
+                del store[len(store)-above:]
+        del self.tags[n:]
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.tags)))]
+        kind, store, j = self.locate(i)
+        return bool(store[j]) if kind == BOOL else store[j]
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self.tags))
+            if i.stop is None and step == 1:
+                self.truncate(start)
+                self.extend(value)
+            else:
+                items = list(self)
+                items[i] = value
+                self.clear()
+                self.extend(items)
+            return
+        kind, store, j = self.locate(i)
+        new = numKind(value)
+        if new == kind:
+            store[j] = value
+        else:
+            #move the item to the store of its new kind
+            if i < 0:
+                i += len(self.tags)
+            del store[j]
+            store = self.stores[new]
+            store.insert(len(store) - self.tags.count(new, i + 1), value)
+            self.tags[i] = new
+
+    def __delitem__(self, i):
+        if isinstance(i, slice) and i.stop is None and i.step is None:
+            self.truncate(i.indices(len(self.tags))[0])
+        else:
+            items = list(self)
+            del items[i]
+            self.clear()
+            self.extend(items)
+
+    def __iter__(self):
+        index = [0, 0, 0, 0]
+        for kind in self.tags:
+            value = self.stores[kind][index[kind]]
+            index[kind] += 1
+            yield bool(value) if kind == BOOL else value
+
+    def __reversed__(self):
+        index = [len(store) for store in self.stores]
+        for kind in reversed(self.tags):
+            index[kind] -= 1
+            value = self.stores[kind][index[kind]]
+            yield bool(value) if kind == BOOL else value
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, NumStack)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
 #dictionary stack operators
 def dictPop():
     """Pop dictstack and return None on failure."""
     if len(dictstack) >= 1:
+        global dictVersion
+        dictVersion += 1
+        unbindTop()
         return dictstack.pop()
     else:
         print('error: not enough items in dictstack')
 
-def dictPush(dictionary={}, chain=0):
+def dictPush(dictionary=None, chain=0):
     """Push empty dict onto dictstack by default and return False on failure."""
+    #fresh dict per call, a shared default would leak definitions across runs
+    if dictionary is None:
+        dictionary = {}
     if isinstance(dictionary, dict):
+        #names in a dict above dict 0 can hide addressed globals
+        if dictionary and dictstack:
+            shadowedNames.update(dictionary)
+        global dictVersion
+        dictVersion += 1
+        bindDict(dictionary)
         dictstack.append((dictionary, chain))
         return True
     else:
         print('error: only dictionaries may be pushed to dictstack')
         return False
 
+def isValidName(string):
+    """Return true if string is a valid name."""
+    if not isinstance(string, str) or len(string) < 2:
+        return False
+    tests = []
+    tests.append(string[0] == '/')
+    tests.append(string[1].isalpha())
+    tests.append(string[1:].isalnum())
+    return all(tests)
+
+#names are interned by the parser so each name is one shared object that
+#carries its dictionary key and whether it can be defined
+class Symbol(str):
+    """Interned name. key is the literal name a lookup searches for and
+       valid is true if the name can be defined."""
+
+#symbol table of every name the parser has seen
+symbols = {}
+
+def symbol(text):
+    """Return the Symbol for text, adding it to the symbol table if new."""
+    sym = symbols.get(text)
+    if sym is None:
+        sym = symbols[text] = Symbol(text)
+        sym.valid = isValidName(sym)
+        sym.key = sym if text[0] == '/' else symbol('/' + text)
+    return sym
+
+def nameKey(name):
+    """Return the dictionary key for looking up name."""
+    return name.key if type(name) is Symbol else '/' + name
+
 def define(name, value):
     """Add name:value pair to top dict in dictstack and return False on fail."""
-
-    def isValidName(string):
-        """Return true if string is a valid name."""
-        if not isinstance(string, str):
-            return False
-        tests = []
-        tests.append(string[0] == '/')
-        tests.append(string[1].isalpha())
-        tests.append(string[1:].isalnum())
-        return all(tests)
-
-    if isValidName(name):
+    #parsed names were checked when they were interned
+    if name.valid if type(name) is Symbol else isValidName(name):
         #if no dictionary in dictstack, push an empty one
         if len(dictstack) < 1:
             dictPush()
+        #calls that inlined the old value must look it up again
+        if name in inlinedSites:
+            uninline(name)
+        if len(dictstack) > 1:
+            shadowedNames.add(name)
+        #memoized procedures may depend on the old value
+        elif name in memoNames:
+            global memoEpoch
+            memoEpoch += 1
+        #a new name in the top dict hides the bindings and cached lookups
+        #below it, new values of names are read through the caches
+        if name not in dictstack[-1][0]:
+            global dictVersion
+            dictVersion += 1
+            if inSync():
+                bindings.setdefault(name, []).append(len(dictstack) - 1)
         #add name:value pair to top dict
         dictstack[-1][0][name] = value
         return True
@@ -76,24 +270,23 @@ def lookup(name):
     """Return most recently defined value for name. None if not found.
     
        name should not have a leading '/'."""
-    for x in reversed(dictstack):
-        for key in x:
-            if key == '/'+name:
-                return x[key]
-    else:
-        print('error: name not found')
+    name = nameKey(name)
+    for d, chain in reversed(dictstack):
+        if name in d:
+            return d[name]
+    print('error: name not found')
 
 def dLookup(name):
     """Return most recently defined value for name. None if not found.
     
        name should not have a leading '/'."""
-    for index, x in enumerate(reversed(dictstack)):
-        for key in x[0]:
-            if key == '/'+name:
-                return (x[0][key], len(dictstack) - index - 1)
-    else:
-        print('error: name not found')
-        return (None, None)
+    name = nameKey(name)
+    for i in range(len(dictstack) - 1, -1, -1):
+        d = dictstack[i][0]
+        if name in d:
+            return (d[name], i)
+    print('error: name not found')
+    return (None, None)
 
 #lookup for assignment 5
 def sLookup(name):
@@ -102,11 +295,12 @@ def sLookup(name):
         print('error: name not found')
         return (None, None)
     #look in dict at top of stack, follow static chain
+    name = nameKey(name)
     i = len(dictstack)-1
     while True:
-        for key in dictstack[i][0]:
-            if key == '/'+name:
-                return(dictstack[i][0][key], i)
+        d = dictstack[i][0]
+        if name in d:
+            return (d[name], i)
         #if end of chain and value not found, break
         if i == dictstack[i][1]:
             break;
@@ -116,121 +310,409 @@ def sLookup(name):
     print('error: name not found')
     return (None, None)
 
+#shallow binding for dynamic scope, bindings maps each name to the stack of
+#indexes of the dicts on dictstack that define it, so the innermost one is
+#found without searching the dict stack
+shallowBinding = True
+bindings = {}
+#dict 0 and the depth of the dictstack the bindings describe
+boundBase = None
+boundDepth = 0
+#true if a dict is on the stack more than once
+aliased = False
+
+def inSync():
+    """Return true if bindings describes dictstack."""
+    return (boundDepth == len(dictstack) and boundDepth > 0 and
+        dictstack[0][0] is boundBase)
+
+def rebuildBindings():
+    """Rebuild bindings from the dicts on dictstack."""
+    global boundBase, boundDepth, aliased
+    bindings.clear()
+    for i, (d, chain) in enumerate(dictstack):
+        for key in d:
+            bindings.setdefault(key, []).append(i)
+    boundBase = dictstack[0][0] if dictstack else None
+    boundDepth = len(dictstack)
+    aliased = len(set(id(d) for d, chain in dictstack)) < len(dictstack)
+
+def bindDict(d):
+    """Add the names of d to bindings before it is pushed onto dictstack."""
+    global boundDepth
+    if not dictstack:
+        #dict 0 starts a new stack, rebuilt on the next lookup
+        return
+    if inSync():
+        i = len(dictstack)
+        for key in d:
+            bindings.setdefault(key, []).append(i)
+        boundDepth += 1
+
+def unbindTop():
+    """Remove the names of the top dict from bindings before it is popped."""
+    global boundDepth
+    if inSync():
+        unbindKeys(dictstack[-1][0])
+        boundDepth -= 1
+
+def unbindKeys(d):
+    """Remove the bindings of the names of d, the top dict of dictstack."""
+    for key in d:
+        indexes = bindings[key]
+        indexes.pop()
+        if not indexes:
+            del bindings[key]
+
+def shallowLookup(name):
+    """Return the same (value, dict index) as dLookup() from bindings."""
+    if not inSync():
+        rebuildBindings()
+    if aliased:
+        return dLookup(name)
+    key = nameKey(name)
+    indexes = bindings.get(key)
+    if indexes:
+        i = indexes[-1]
+        return (dictstack[i][0][key], i)
+    #let dLookup report the error
+    return dLookup(name)
+
+def replaceFrame(chain, reuse=False):
+    """Replace the top dict of dictstack with an empty one linked to chain.
+
+       If reuse is true the top dict is emptied and used again."""
+    global dictVersion
+    dictVersion += 1
+    d = dictstack[-1][0]
+    if inSync():
+        unbindKeys(d)
+    if reuse:
+        d.clear()
+    else:
+        d = newFrame()
+    dictstack[-1] = (d, chain)
+
+def benchLookup(sizes=(10, 1000, 100000), n=100000, depth=3):
+    """Return seconds per lookup of a name in dict 0 for each dict size.
+
+       Each lookup goes through depth dicts of size definitions, so the times
+       should stay flat as size grows."""
+    import time
+    global dictstack
+    saved = dictstack
+    res = {}
+    try:
+        for size in sizes:
+            d = {'/k%d' % i: i for i in range(size)}
+            dictstack = [({'/x': 1}, 0)] + [(d, 0) for i in range(depth)]
+            name = symbol('x')
+            for fn in (dLookup, sLookup):
+                start = time.perf_counter()
+                for i in range(n):
+                    fn(name)
+                res[size, fn.__name__] = (time.perf_counter() - start) / n
+    finally:
+        dictstack = saved
+    return res
+
+
+#code arrays are immutable tuples and integer arrays are lists, so the
+#interpreter can tell them apart by type instead of scanning their elements
+class Procedure(tuple):
+    """Code array of a procedure, compares equal to a list of its items.
+
+       What is derived from it, such as its compiled code, is kept in its
+       instance dict so it goes away with it, see derived()."""
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(x == y for x, y in
+            zip(self, other))
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        return res if res is NotImplemented else not res
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return repr(list(self))
+
+class PSArray(list):
+    """Integer array."""
+    __slots__ = ()
+
+def isIntList(res):
+    """Return true if every item of the list res is an integer."""
+    return all(isinstance(x, int) for x in res)
+
+#-------------------------Operator registry-------------------------------
+
+#operand types operators declare
+number = (int, float)
+boolean = (bool,)
+array = (list, Procedure)
+anything = (object,)
+
+class OpInfo:
+    """What an operator declares with psOp()."""
+    __slots__ = ('name', 'function', 'nops', 'types', 'pure', 'apply',
+        'check', 'results')
+
+#name:OpInfo of every operator
+registry = {}
+#operator names and the functions that implement them
+operators = {}
+#function:name of every operator
+operatorNames = {}
+
+def makeCheck(types):
+    """Return a check of the operands on top of a stack of at least
+       len(types) items, in push order, that does not copy them."""
+    if types is None:
+        return lambda st: True
+    n = len(types)
+    if n == 1:
+        t = types[0]
+        return lambda st: isinstance(st[-1], t)
+    if n == 2:
+        t0, t1 = types
+        return lambda st: isinstance(st[-2], t0) and isinstance(st[-1], t1)
+    def check(st):
+        i = len(st) - n
+        for t in types:
+            if not isinstance(st[i], t):
+                return False
+            i += 1
+        return True
+    return check
+
+def psOp(name, nops=None, types=None, pure=False, apply=None, results=None):
+    """Decorator registering a function as the SPS operator name.
+
+       nops is the number of operands it pops, None if it varies, and types
+       the tuple of accepted types of each operand in push order. A pure
+       operator only replaces its operands with its results, results is how
+       many it pushes and defaults to 1 if it has apply. apply computes the
+       result of a pure operator from its operands in push order, the
+       optimizer folds it when the operands are literals. The function gets
+       check, the check for opReady() and opBase() built from types."""
+    if results is None and apply is not None:
+        results = 1
+    def register(function):
+        info = OpInfo()
+        info.name, info.function, info.nops = name, function, nops
+        info.types, info.pure, info.apply = types, pure, apply
+        info.results = results
+        info.check = function.check = makeCheck(types)
+        registry[name] = info
+        operators[name] = function
+        operatorNames[function] = name
+        return function
+    return register
 
 #Arithmetic and comparison operators
+def opBase(operator, typeCheck=lambda x:True, nops=2):
+    """Base function for operand functions.
+
+       Pop nops items off opstack, and push the result of operator. If result
+       is iterable it is iterated over pushing each item to opstack, otherwise
+       result is just pushed. typeCheck is an optional boolean func accepting
+       list of args in pushed order to check the arguments before they are
+       popped. Operators that run often use opReady() and work on opstack
+       directly instead, since this copies the arguments."""
+
+    #check operation is valid
+    if len(opstack) < nops:
+        opError('error: not enough arguments on opstack')
+    elif not typeCheck(opstack[-nops:]):
+        opError('error: arguments of incorrect type')
+    #exe operation
+    else:
+        ops = opPopn(nops)
+        results = operator(ops)
+        if isinstance(results, Iterable):
+            for x in results:
+                opPush(x)
+        else:
+            opPush(results)
+
+def opReady(nops, check):
+    """Return true if the top nops items of opstack are operands that pass
+       check, otherwise print the error and return False."""
+    if len(opstack) < nops:
+        opError('error: not enough arguments on opstack')
+        return False
+    if not check(opstack):
+        opError('error: arguments of incorrect type')
+        return False
+    return True
+
+def opError(message):
+    """Print the error of an operator that could not run."""
+    #memoized calls that are running would not print it again
+    if memoActive:
+        poisonMemos()
+    print(message)
+
+@psOp('add', 2, (number, number), True, operator.add)
+def add():
     """Pop opstack twice and push sum."""
-    opBase(lambda x:x[1]+x[0], isNumeric)
+    if opReady(2, add.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] + x
 
+@psOp('sub', 2, (number, number), True, operator.sub)
 def sub():
     """Pop opstack twice and push difference."""
-    opBase(lambda x:x[1]-x[0], isNumeric)
+    if opReady(2, sub.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] - x
 
+@psOp('mul', 2, (number, number), True, operator.mul)
 def mul():
     """Pop opstack twice and push product."""
-    opBase(lambda x:x[1]*x[0], isNumeric)
+    if opReady(2, mul.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] * x
 
+@psOp('div', 2, (number, number), True, operator.truediv)
 def div():
     """Pop opstack twice and push quotient."""
-    opBase(lambda x:x[1]/x[0], isNumeric)
+    if opReady(2, div.check):
+        #both operands are gone if the division raises
+        x = opstack.pop()
+        y = opstack.pop()
+        opstack.append(y / x)
 
+@psOp('mod', 2, (number, number), True, operator.mod)
 def mod():
     """Pop opstack twice and push remainder."""
-    opBase(lambda x:x[1]%x[0], isNumeric)
+    if opReady(2, mod.check):
+        x = opstack.pop()
+        y = opstack.pop()
+        opstack.append(y % x)
 
+@psOp('lt', 2, (number, number), True, operator.lt)
 def lt():
     """Pop opstack twice and push result of op1<op2."""
-    opBase(lambda x:x[1]<x[0], isNumeric)
+    if opReady(2, lt.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] < x
 
+@psOp('gt', 2, (number, number), True, operator.gt)
 def gt():
     """Pop opstack twice and push result of op1>op2."""
-    opBase(lambda x:x[1]>x[0], isNumeric)
+    if opReady(2, gt.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] > x
 
+@psOp('eq', 2, (number, number), True, operator.eq)
 def eq():
     """Pop opstack twice and push result of op1==op2."""
-    opBase(lambda x:x[1]==x[0], isNumeric)
+    if opReady(2, eq.check):
+        x = opstack.pop()
+        opstack[-1] = opstack[-1] == x
 
+@psOp('neg', 1, (number,), True, operator.neg)
 def neg():
     """Pop opstack and push negation onto opstack."""
-    opBase(lambda x:-x[0], isNumeric, 1)
+    if opReady(1, neg.check):
+        opstack[-1] = -opstack[-1]
 
 #array operators
+#code arrays are immutable, only integer arrays can be changed
+@psOp('put', 3, (list, int, anything))
 def put():
     """Pop value, index, and array, push array[index] = val."""
-    def operation(ops):
-        val, index, arr = ops
+    if opReady(3, put.check):
+        val = opstack.pop()
+        index = opstack.pop()
+        arr = opstack.pop()
         arr[index] = val
-        return arr
-
-    def typeCheck(ops):
-        tests = []
-        arr, index, val = ops
-        tests.append(isinstance(index, int))
-        tests.append(isinstance(arr, list))
-        return all(tests)
-
-    opBase(operation, typeCheck, 3) 
+        #the items of the array are pushed, not the array
+        opstack.extend(arr)
 
+@psOp('length', 1, (array,), True, results=1)
 def length():
     """Pop array from stack and push length of array."""
-    opBase(lambda x:len(x[0]), lambda x:isinstance(x[0], list), 1)
+    if opReady(1, length.check):
+        opstack[-1] = len(opstack[-1])
 
+@psOp('get', 2, (array, int), True)
 def get():
     """Pop index and array from opstack and push val array[index]."""
-    def typeCheck(ops):
-        tests = []
-        arr, index = ops
-        tests.append(isinstance(arr, list))
-        tests.append(isinstance(index, int))
-        return all(tests)
-
-    opBase(lambda x:x[1][x[0]], typeCheck)
+    if opReady(2, get.check):
+        index = opstack.pop()
+        value = opstack.pop()[index]
+        #an item that is itself iterable is pushed item by item, integers
+        #skip the abc check which allocates
+        if type(value) is not int and isinstance(value, Iterable):
+            opstack.extend(value)
+        else:
+            opstack.append(value)
 
 #boolean operators
-def isBool(args):
-    """Return true if all values in args are numeric."""
-    for x in args:
-        if not isinstance(x, bool):
-            return False
-    else:
-        return True
-
+@psOp('and', 2, (boolean, boolean), True, lambda a, b: b and a)
 def psAnd():
     """Pop opstack twice and push result of op1 AND op2."""
-    opBase(lambda x:x[0] and x[1], isBool)
+    if opReady(2, psAnd.check):
+        x = opstack.pop()
+        opstack[-1] = x and opstack[-1]
 
+@psOp('or', 2, (boolean, boolean), True, lambda a, b: b or a)
 def psOr():
     """Pop opstack twice and push result of op1 OR op2."""
-    opBase(lambda x:x[0] or x[1], isBool)
+    if opReady(2, psOr.check):
+        x = opstack.pop()
+        opstack[-1] = x or opstack[-1]
 
+@psOp('not', 1, (boolean,), True, operator.not_)
 def psNot():
     """Pop opstack and push result of NOT."""
-    opBase(lambda x:not x[0], isBool, 1)
+    if opReady(1, psNot.check):
+        opstack[-1] = not opstack[-1]
 
 #stack manipulation and operators
+@psOp('dup', 1, (anything,), True, results=2)
 def dup():
-    opBase(lambda x: [x[0], x[0]], nops=1)
+    if opReady(1, dup.check):
+        opstack.append(opstack[-1])
 
+@psOp('exch', 2, (anything, anything), True, results=2)
 def exch():
     """Exchange top two opstack values."""
-    opBase(lambda x:x)
+    if opReady(2, exch.check):
+        opstack[-1], opstack[-2] = opstack[-2], opstack[-1]
 
+@psOp('pop', 1, (anything,), True, results=0)
 def pop():
     """Pop opstack and return value."""
     return opPop()
 
+@psOp('copy', 1, (int,))
 def copy():
     """Pop opstack and copy the top op1 values onto opstack."""
-    def operation(ops):
-        push = list(ops[1:])
-        push.extend(push)
-        return reversed(push)
-
-    opBase(operation, nops=opstack[-1]+1)
-
+    if not opReady(1, copy.check):
+        return
+    n = opstack[-1]
+    #a negative count copies nothing and leaves the count
+    if n >= 0 and opReady(n + 1, copy.check):
+        opstack.pop()
+        i = len(opstack) - n
+        while n:
+            opstack.append(opstack[i])
+            i += 1
+            n -= 1
+
+@psOp('clear')
 def clear():
     """Clear all items from opstack."""
     opstack.clear()
 
+@psOp('stack', 0)
 def stack():
     """Diplay contents of opstack."""
     print(gscope)
@@ -246,68 +728,85 @@ def stack():
             print(key, '   ', x[0][key])
     print('==============')
 
+@psOp('=', 1, (anything,))
 def popPrint():
     print(pop())
 
+@psOp('count', 0)
 def count():
     opPush(len(opstack))
 
 #dictionary manipulation operators
+@psOp('dict', 1, (number,))
 def psDict():
     """Pop integer off opstack and push an empty dict."""
     #pop integer off stack
-    opBase(lambda x:(), isNumeric, 1)
+    if opReady(1, psDict.check):
+        opstack.pop()
     opPush({})
 
+@psOp('begin', 1, (dict,))
 def begin():
     """Pop dict from opstack and push onto dictstack."""
     if len(opstack) > 0 and isinstance(opstack[-1], dict):
+        #the dict may hide procedures whose calls were inlined
+        for name in [name for name in inlinedSites if name in opstack[-1]]:
+            uninline(name)
+        #bindings can not follow a dict that is on the stack twice
+        global aliased
+        if any(d is opstack[-1] for d, chain in dictstack):
+            aliased = True
         dictPush(opPop())
 
+@psOp('end', 0)
 def end():
     """Pop dictstack."""
+    global dictVersion
+    dictVersion += 1
+    unbindTop()
     dictstack.pop()
 
+@psOp('def', 2, (anything, anything))
 def psDef():
     """Pop a value then name off opstack and add definition."""
-    def operation(ops):
-        val, name = ops
-        define(name, val)
-        return ()
-
-    opBase(operation, nops=2)
+    if opReady(2, psDef.check):
+        val = opstack.pop()
+        define(opstack.pop(), val)
 
 #-------------------------Part 2----------------------------------------
 
 #control operators
+@psOp('if', 2, (boolean, array))
 def psIf():
     """Pop a bool and code block from opstack, exe code if bool is true."""
     def operator(ops):
         if ops[1]:
-            interpretSPS(ops[0], gscope)
+            execute(compileSPS(ops[0], gscope), gscope)
     def typecheck(ops):
-        return isinstance(ops[1], list) and not all(isinstance(x, int) for x in ops[1]) and isinstance(ops[0], bool)
+        return isProcedure(ops[1]) and isinstance(ops[0], bool)
 
     opBase(operator, typecheck)
     #pop result of operator off of stack since no result is desired
     opPop()
 
+@psOp('ifelse', 3, (boolean, array, array))
 def psIfelse():
     """pop a bool and two codeblocks from opstack, exe first block if bool is
     true, second block if false."""
     def operator(ops):
         if ops[2]:
-            interpretSPS(ops[1], gscope)
+            execute(compileSPS(ops[1], gscope), gscope)
         else:
-            interpretSPS(ops[0], gscope)
+            execute(compileSPS(ops[0], gscope), gscope)
 
     def typecheck(ops):
-        return isinstance(ops[2], list) and isinstance(ops[1], list) and isinstance(ops[0], bool)
+        return isArray(ops[2]) and isArray(ops[1]) and isinstance(ops[0], bool)
 
     opBase(operator, typecheck, 3)
     #pop result of operator off of stack since no result is desired
     opPop()
 
+@psOp('for', 4, (int, int, int, array))
 def psFor():
     """Pop <init><incr><final><codearray> off opstack, pushing the current
     iteration value to opstack then executing the codearray for each loop."""
@@ -319,11 +818,11 @@ def psFor():
             end = final + 1
         else:
             end = final - 1
+        #compile once, not once per iteration
+        code = compileSPS(code_array, gscope)
         for x in range(init, end, incr):
             opPush(x)
-            #print('after push: ', t.opstack)
-            interpretSPS(code_array, gscope)
-            #print('after eval: ', t.opstack)
+            execute(code, gscope)
 
     def typecheck(ops):
         #unpack ops for clarity
@@ -332,32 +831,31 @@ def psFor():
         tests.append(isinstance(init, int))
         tests.append(isinstance(incr, int))
         tests.append(isinstance(final, int))
-        tests.append(isinstance(code_array, list) and
-            not all(isinstance(x, int) for x in code_array))
+        tests.append(isProcedure(code_array))
         return all(tests)
     
     opBase(operator, typecheck, 4)
     #pop result of operator off of stack since no result is desired
     opPop()
 
+@psOp('forall', 2, (array, array))
 def forAll():
     """Pop array and codeblock from opstack, execute codeblock on each item in
     array pushing each result to opstack."""
     def operator(ops):
         #unpack ops for clarity
         procedure, arr = ops
+        code = compileSPS(procedure, gscope)
         for x in arr:
             opPush(x)
-            interpretSPS(procedure, gscope)
+            execute(code, gscope)
 
     def typecheck(ops):
         #unpack ops for clarity
         arr, procedure = ops
         tests = []
-        tests.append(isinstance(arr, list) and all(isinstance(x, int) for x
-            in arr))
-        tests.append(isinstance(procedure, list) and
-            not all(isinstance(x, int) for x in procedure))
+        tests.append(isIntArray(arr))
+        tests.append(isProcedure(procedure))
         return all(tests)
 
     opBase(operator, typecheck)
@@ -365,19 +863,100 @@ def forAll():
     opPop()
         
 
+#operands each operator is measured with in benchAllocations()
+allocSamples = {
+    'add':(3, 4), 'sub':(3, 4), 'mul':(3, 4), 'div':(3, 4), 'mod':(7, 3),
+    'lt':(3, 4), 'gt':(3, 4), 'eq':(3, 4), 'neg':(3,), 'and':(True, False),
+    'or':(True, False), 'not':(True,), 'dup':(5,), 'exch':(1, 2), 'pop':(1,),
+    'copy':(1, 2, 2), 'length':(Procedure((1, 'x')),),
+    'get':(Procedure((1, 'x')), 0), 'count':(), 'clear':(1, 2),
+    'def':(symbol('/x'), 1),
+}
+
+def benchAllocations(names=None, n=1000):
+    """Return name:bytes the operator allocates at its peak during one call,
+       the most of n calls after a first one on its sample operands.
+
+       Memory is traced with tracemalloc, so results and temporary lists,
+       tuples and generators all count but objects Python caches like small
+       ints do not."""
+    import tracemalloc
+    global opstack, dictstack
+    saved = opstack, dictstack
+    res = {}
+    wasTracing = tracemalloc.is_tracing()
+    if not wasTracing:
+        tracemalloc.start()
+    try:
+        for name in names or allocSamples:
+            operands, function = allocSamples[name], operators[name]
+            #padding keeps the stack from being resized as it grows and shrinks
+            opstack = [None] * 64
+            dictstack = [({'/x':0}, 0)]
+            worst = 0
+            for i in range(n + 1):
+                opstack[64:] = operands
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                function()
+                if i:
+                    worst = max(worst, tracemalloc.get_traced_memory()[1] - base)
+            res[name] = worst
+    finally:
+        if not wasTracing:
+            tracemalloc.stop()
+        opstack, dictstack = saved
+    return res
+
 #tokenizes an input string
 def tokenize(s):
     """Break an input string into list of tokens."""
     return re.findall("/?[a-zA-Z][a-zA-Z0-9_]*|[[][a-zA-Z0-9_\s!][a-zA-Z0\
         -9_\s!]*[]]|[-]?[0-9]+|[}{]+|%.*|[^ \t\n]", s)
 
+#parsed code arrays with the same items are one shared object, so they are
+#compiled and cached once
+shareProcedures = True
+#shared code arrays of the program being parsed, items with their
+#types:Procedure. parse() empties it when it is done, so the table does not
+#keep old programs alive.
+procedures = {}
+#ids of the shared code arrays
+sharedIds = set()
+#types of items that can not change
+atomTypes = {int, float, bool, Symbol}
+
+def shareProcedure(res):
+    """Return the shared code array of the items res, creating it if new.
+
+       Code arrays holding arrays, which put can change, are not shared."""
+    if not shareProcedures:
+        return Procedure(res)
+    key = []
+    for x in res:
+        t = type(x)
+        if t in atomTypes:
+            #1 and true are equal but not the same item
+            key.append((t, x))
+        elif t is Procedure and id(x) in sharedIds:
+            key.append((t, id(x)))
+        else:
+            return Procedure(res)
+    key = tuple(key)
+    code = procedures.get(key)
+    if code is None:
+        code = procedures[key] = Procedure(res)
+        sharedIds.add(id(code))
+    return code
+
 #matches code arrays
 def groupMatching2(it):
     """Creates sublists of matching '{' characters."""
     res = []
     for c in it:
         if c == '}':
-            return res
+            #a group of only integers is an integer array
+            return PSArray(res) if isIntList(res) else shareProcedure(res)
         elif c == '{':
             res.append(groupMatching2(it))
         else:
@@ -395,7 +974,7 @@ def groupMatching3(it):
     res = []
     for c in it:
         if c == ']':
-            return res
+            return PSArray(res) if isIntList(res) else res
         elif c == '[':
             res.append(groupMatching3(it))
         else:
@@ -422,81 +1001,2475 @@ def convert(c):
         return groupMatching3(iter(tokenizeArray(c)))[0]
     #named constant
     else:
-        return c
+        return symbol(c)
 
 #accepts list of tokens from tokenize, converting into correct python types
 def parse(tokens):
     """Converts a list of input tokens into python data types for use."""
     res = []
     it = iter(tokens)
-    for c in it:
-        if c == '}':
-            return False
-        elif c == '{':
-            res.append(groupMatching2(it))
+    try:
+        for c in it:
+            if c == '}':
+                return False
+            elif c == '{':
+                res.append(groupMatching2(it))
+            else:
+                res.append(convert(c))
+    finally:
+        procedures.clear()
+        sharedIds.clear()
+    return res
+
+#-------------------------Compiler----------------------------------------
+
+def derived(code):
+    """Return the dict that keeps what is derived from the code array code,
+       None if code is not a Procedure. Other arrays can change, so nothing
+       is cached for them."""
+    if type(code) is Procedure:
+        return code.__dict__
+    return None
+
+#opcodes. Compiled code is a flat list of (opcode, arg) instructions ending
+#in END, control operators with literal code blocks are compiled to jumps.
+OP = 0          #call operator function arg
+PUSH = 1        #push arg
+NAME = 2        #look up variable, arg is (name, lookup function, scope,
+                #true if calls may be inlined)
+JUMP = 3        #jump to index arg
+IFNOT = 4       #pop bool and jump if false, arg is (target, code block)
+IFELSE = 5      #pop bool and jump to else if false, arg is (else, end, A, B)
+FORPREP = 6     #start a for loop, arg is (exit, code block, true if its
+                #invariant lookups can be hoisted)
+FORALLPREP = 7  #start a forall loop, same arg as FORPREP
+NEXT = 8        #push next loop value or exit loop, arg is (exit, LoopSite)
+EXECIF = 9      #if with operands only known at runtime
+EXECIFELSE = 10 #ifelse with operands only known at runtime
+EXECFOR = 11    #for with operands only known at runtime
+EXECFORALL = 12 #forall with operands only known at runtime
+END = 13        #return from compiled code, arg is the code's dict use once
+                #dictUse() has found it
+TAILNAME = 14   #NAME directly followed by END, same arg as NAME
+ADAPT = 15      #operator that specializes on its operand types, arg is
+                #[function, deoptimizations]
+SPEC = 16       #type specialized operator, arg is (fast handler, function,
+                #deoptimizations)
+SEG = 17        #straight-line run compiled to a function, arg is (function,
+                #first instruction of the run)
+
+#control stack frame kinds
+CALL = 0        #procedure call, pops its dict on return
+BLOCK = 1       #code block run by if/ifelse
+LOOP = 2        #code block run by for/forall, reruns until the loop is done
+NOFRAME = 3     #procedure call that runs without a dict of its own
+MEMO = 4        #memoized procedure call, stores its results on return
+
+#how compiled code uses the dict of the call running it
+NODICT = 0      #defines nothing, can run without a dict
+OWNDICT = 1     #defines names, its dict can be reused after it returns
+ANYDICT = 2     #may begin and end dicts, so the dict popped on return may
+                #not be its own
+
+#operators compiled to opcodes rather than function calls
+controlOps = {'if':EXECIF, 'ifelse':EXECIFELSE, 'for':EXECFOR,
+    'forall':EXECFORALL}
+
+#marks an exhausted loop iterator
+done = object()
+
+def isProcedure(value):
+    """Return true if value is a code array rather than an integer array."""
+    if type(value) is Procedure:
+        return True
+    #plain lists come from code built outside the parser
+    return type(value) is list and not isIntList(value)
+
+def isIntArray(value):
+    """Return true if value is an integer array."""
+    if type(value) is PSArray:
+        return True
+    return type(value) is list and isIntList(value)
+
+def isArray(value):
+    """Return true if value is a code array or an integer array."""
+    return isinstance(value, (list, Procedure))
+
+#optimization level, 0 compiles code arrays as they are parsed, 1 folds
+#constants and removes operator pairs that do nothing
+optLevel = 1
+
+#operator pairs that leave the stack as it was
+noOpPairs = {('exch', 'exch'), ('dup', 'pop')}
+
+def isLiteral(value):
+    """Return true if value is a number or bool constant of a code array."""
+    return type(value) in (int, float, bool)
+
+def optimize(code, depth=0):
+    """Return an optimized copy of a code array created with parse().
+
+       Pure operators registered with an apply function are folded when
+       their operands are literals, if and ifelse on a literal bool are
+       replaced by the block that runs, and operator pairs that do nothing
+       are removed where the stack surely holds their operands, depth being
+       the items known to be on it when the code starts. Code blocks used as
+       values are left alone since they can be printed."""
+    res = []
+
+    def known():
+        """Return the items the code so far surely leaves on the stack."""
+        d = depth
+        for x in res:
+            info = registry.get(x) if isinstance(x, str) else None
+            if isLiteral(x) or isArray(x) or (isinstance(x, str) and
+                x[0] == '/'):
+                d += 1
+            #names may call procedures that take anything off the stack
+            elif (info is None or info.nops is None or info.results is None
+                or d < info.nops):
+                d = 0
+            #operators that check operand types push nothing if they fail
+            elif any(t is not anything for t in info.types):
+                d -= info.nops
+            else:
+                d += info.results - info.nops
+        return d
+
+    def pairRemovable():
+        """Return true if the stack surely holds the operands of the operator
+           on top of res, without them both operators of the pair print an
+           error."""
+        first = res.pop()
+        d = known()
+        res.append(first)
+        return d >= registry[first].nops
+
+    def feed(code):
+        i = 0
+        while i < len(code):
+            value = code[i]
+            nxt = code[i+1] if i + 1 < len(code) else None
+            nxt2 = code[i+2] if i + 2 < len(code) else None
+            cond = res[-1] if res and type(res[-1]) is bool else None
+            #true {A} if
+            if cond is not None and isProcedure(value) and nxt == 'if':
+                res.pop()
+                if cond:
+                    feed(value)
+                i += 2
+            #true {A} {B} ifelse
+            elif (cond is not None and isArray(value) and
+                isArray(nxt) and nxt2 == 'ifelse'):
+                res.pop()
+                feed(value if cond else nxt)
+                i += 3
+            else:
+                add(value)
+                i += 1
+
+    def add(value):
+        info = registry.get(value) if isinstance(value, str) else None
+        if info is not None and info.pure and info.apply is not None:
+            nops = info.nops
+            args = res[len(res)-nops:]
+            if len(args) == nops and all(isLiteral(x) and isinstance(x, t)
+                for x, t in zip(args, info.types)):
+                #leave operations that fail, like division by zero, to run
+                try:
+                    result = info.apply(*args)
+                except ArithmeticError:
+                    result = None
+                if isLiteral(result):
+                    del res[len(res)-nops:]
+                    res.append(result)
+                    return
+        if (res and isinstance(value, str) and isinstance(res[-1], str) and
+            (res[-1], value) in noOpPairs and pairRemovable()):
+            res.pop()
+        #a literal that is popped right away
+        elif res and value == 'pop' and isLiteral(res[-1]):
+            res.pop()
         else:
-            res.append(convert(c))
+            res.append(value)
+
+    feed(code)
+    return res
+
+def compileSPS(code, scope, cache=True, entry=None):
+    """Compile a code array created with parse() into flat instructions.
+
+       The result is cached on the code array per scope and optLevel so
+       each procedure is only compiled once. entry is the
+       abstract stack the code starts on if it is known, see analyzeStack()."""
+    info = derived(code)
+    key = (scope, optLevel)
+    if info is not None and key in info.setdefault('compiled', {}):
+        return info['compiled'][key]
+    res = []
+    compileBlock(code, scope, res, depth=len((entry or unknownStack)[0]))
+    res.append((END, None))
+    markTailCalls(res)
+    if scope == 'static':
+        addressNames(res, code)
+    if lookupCaching:
+        cacheLookups(res)
+    removeChecks(res, entry or unknownStack)
+    compileRuns(res)
+    if cache and info is not None:
+        info['compiled'][key] = res
+    return res
+
+def compileBlock(code, scope, res, slots=None, depth=0):
+    """Append the instructions for code to res.
+
+       Literal code blocks directly followed by if, ifelse, for or forall are
+       compiled inline with jumps instead of being pushed. slots maps the
+       names of the slot block code is in to their slots, see slotKeys().
+       depth is the number of items known to be on the stack when code
+       starts, see optimize()."""
+    if optLevel:
+        code = optimize(code, depth)
+    i = 0
+    while i < len(code):
+        value = code[i]
+        nxt = code[i+1] if i + 1 < len(code) else None
+        nxt2 = code[i+2] if i + 2 < len(code) else None
+        end = slotBlockEnd(code, i) if slots is None else None
+        keys = slotKeys(code[i+3:end], scope) if end is not None else None
+        #N dict begin ... end with its names kept in a slot array
+        if keys is not None:
+            res.append((OP, beginSlots(keys)))
+            compileBlock(code[i+3:end], scope, res,
+                {key: n for n, key in enumerate(keys)})
+            res.append((OP, endSlots))
+            i = end + 1
+        #{A} if
+        elif isProcedure(value) and isinstance(nxt, str) and nxt == 'if':
+            at = len(res)
+            res.append(None)
+            compileBlock(value, scope, res, slots)
+            res[at] = (IFNOT, (len(res), value))
+            i += 2
+        #{A} {B} ifelse, ifelse also runs integer arrays
+        elif (isArray(value) and isArray(nxt) and
+            isinstance(nxt2, str) and nxt2 == 'ifelse'):
+            at = len(res)
+            res.append(None)
+            compileBlock(value, scope, res, slots)
+            jump = len(res)
+            res.append(None)
+            compileBlock(nxt, scope, res, slots)
+            res[at] = (IFELSE, (jump + 1, len(res), value, nxt))
+            res[jump] = (JUMP, len(res))
+            i += 3
+        #{A} for and {A} forall
+        elif (isProcedure(value) and isinstance(nxt, str) and
+            nxt in ('for', 'forall')):
+            at = len(res)
+            res.append(None)
+            res.append(None)
+            compileBlock(value, scope, res, slots)
+            res.append((JUMP, at + 1))
+            prep = FORPREP if nxt == 'for' else FORALLPREP
+            #hoisted copies are compiled without the slots
+            res[at] = (prep, (len(res), value, slots is None))
+            res[at+1] = (NEXT, (len(res), LoopSite(at + 1)))
+            i += 2
+        else:
+            res.append(compileValue(value, scope, slots))
+            i += 1
+
+def markTailCalls(res):
+    """Turn NAME instructions whose next executed instruction is END into
+    TAILNAME instructions."""
+    for i, (op, arg) in enumerate(res):
+        if op == NAME:
+            #follow jumps to the next executed instruction
+            j = i + 1
+            while res[j][0] == JUMP:
+                j = res[j][1]
+            if res[j][0] == END:
+                res[i] = (TAILNAME, arg)
+
+#lexical addressing, a static scope name the code array being compiled can
+#not define is resolved straight to dict 0 instead of along the static chain
+#names defined in a dict above dict 0, addressed lookups of them walk the
+#static chain again
+shadowedNames = set()
+
+def globalAddress(key):
+    """Return a lookup function for a name addressed to dict 0.
+
+       The function returns (value, 0) like sLookup() does. Names that may
+       be hidden by another dict walk the static chain instead."""
+    def lookup(name):
+        if key not in shadowedNames and dictstack:
+            d = dictstack[0][0]
+            if key in d:
+                return (d[key], 0)
+        return sLookup(name)
+    return lookup
+
+def addressNames(res, code):
+    """Address the variables of the instructions res compiled from code.
+
+       Only names with no literal in code are addressed, the others may be
+       defined in the frame code runs in."""
+    local = literalNames(code, {})
+    for i, (op, arg) in enumerate(res):
+        if (op in (NAME, TAILNAME) and arg[1] is sLookup and
+            nameKey(arg[0]) not in local):
+            res[i] = (op, (arg[0], globalAddress(nameKey(arg[0]))) + arg[2:])
+
+#slot blocks, N dict begin ... end blocks whose names are all known when
+#they are compiled keep their values in a list instead of a dict
+#values of the running slot blocks, innermost last
+slotFrames = []
+
+#value of a slot that has not been defined
+noValue = object()
+
+class SlotFrame:
+    """Values of a running slot block, and the dict holding them once the
+       block has needed a real dict."""
+    __slots__ = ('keys', 'values', 'dict')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.values = [noValue] * len(keys)
+        self.dict = None
+
+def slotBlockEnd(code, i):
+    """Return the index of the end of a N dict begin ... end block starting
+       at i in code, None if there is none."""
+    if type(code[i]) is not int or list(code[i+1:i+3]) != ['dict', 'begin']:
+        return None
+    for j in range(i + 3, len(code)):
+        if isinstance(code[j], str) and code[j] in ('begin', 'end'):
+            return j if code[j] == 'end' else None
+    return None
+
+def slotKeys(body, scope):
+    """Return the names body defines if a dict begin ... end block around it
+       can keep them in a slot array, None if it needs a real dict.
+
+       The body may not push code blocks, run control operators on blocks
+       from the stack or use begin, end or stack. In dynamic scope the
+       procedures it calls could see its dict, so the body may only use its
+       own names. In static scope the block gets a real dict before it calls
+       a procedure, see slotLookup()."""
+    keys = []
+    names = set()
+
+    def check(code):
+        i = 0
+        while i < len(code):
+            value = code[i]
+            nxt = code[i+1] if i + 1 < len(code) else None
+            nxt2 = code[i+2] if i + 2 < len(code) else None
+            if isProcedure(value) and nxt in ('if', 'for', 'forall'):
+                if not check(value):
+                    return False
+                i += 2
+            elif isArray(value) and isArray(nxt) and nxt2 == 'ifelse':
+                if not (check(value) and check(nxt)):
+                    return False
+                i += 3
+            elif isProcedure(value) or (isinstance(value, str) and value in
+                ('if', 'ifelse', 'for', 'forall', 'begin', 'end', 'stack')):
+                return False
+            else:
+                if (isinstance(value, str) and value[0] == '/' and
+                    isValidName(value) and value not in keys):
+                    keys.append(value)
+                elif isinstance(value, str) and value not in operators:
+                    names.add(nameKey(value))
+                i += 1
+        return True
+
+    if not check(body):
+        return None
+    if scope == 'dynamic' and not names <= set(keys):
+        return None
+    return tuple(keys)
+
+def materialize(frame):
+    """Move the values of a slot block into a dict pushed like begin does."""
+    frame.dict = {key: value for key, value in zip(frame.keys, frame.values)
+        if value is not noValue}
+    dictPush(frame.dict, 0)
+
+def beginSlots(keys):
+    """Return the operator starting a slot block with names keys."""
+    def begin():
+        slotFrames.append(SlotFrame(keys))
+    return begin
+
+def endSlots():
+    """End the innermost slot block."""
+    frame = slotFrames.pop()
+    if frame.dict is not None:
+        end()
+
+def slotDef(slots):
+    """Return def for a slot block whose names are mapped to slots by slots.
+
+       Names outside the block's slots need a real dict."""
+    def define():
+        frame = slotFrames[-1]
+        st = opstack
+        if (frame.dict is None and len(st) >= 2 and
+            isinstance(st[-2], str) and st[-2] in slots):
+            value = st.pop()
+            frame.values[slots[st.pop()]] = value
+            return
+        if frame.dict is None:
+            materialize(frame)
+        psDef()
+    return define
+
+def rootLookup(name):
+    """sLookup() starting at dict 0."""
+    key = nameKey(name)
+    if dictstack and key in dictstack[0][0]:
+        return (dictstack[0][0][key], 0)
+    print('error: name not found')
+    return (None, None)
+
+def slotLookup(index, scope):
+    """Return the lookup function of a variable in a slot block, reading
+       slot index of the running block if index is not None."""
+    lookup = sLookup
+    if scope == 'dynamic':
+        lookup = shallowLookup if shallowBinding else dLookup
+
+    def get(name):
+        frame = slotFrames[-1]
+        if frame.dict is None:
+            value = noValue if index is None else frame.values[index]
+            #the static chain of the block's dict goes straight to dict 0
+            if value is noValue:
+                if scope != 'static':
+                    return lookup(name)
+                found = rootLookup(name)
+                if not isProcedure(found[0]):
+                    return found
+            elif not isProcedure(value):
+                return (value, None)
+            #a procedure's static chain starts at the dict it is found in,
+            #and the procedures it calls can see the block's dict with stack
+            materialize(frame)
+        return lookup(name)
+    return get
+
+#inline lookup caches, each variable instruction keeps the dict its last
+#lookup found the name in until a name is added or the dict stack changes
+lookupCaching = True
+
+#bumped by every push and pop of dictstack and every new name in its dicts
+dictVersion = 0
+
+#lookups answered from a cache and lookups that had to search
+cacheHits = 0
+cacheMisses = 0
+
+def lookupCache(lookup, name):
+    """Return a lookup function for name that reads it from the dict lookup
+       last found it in while dictVersion is unchanged."""
+    key = nameKey(name)
+    version = -1
+    found = None
+    index = None
+
+    def cached(name):
+        nonlocal version, found, index
+        global cacheHits, cacheMisses
+        if version == dictVersion:
+            cacheHits += 1
+            return (found[key], index)
+        cacheMisses += 1
+        res = lookup(name)
+        #names that are not found are searched again so the error is printed
+        if res[1] is not None:
+            version = dictVersion
+            found = dictstack[res[1]][0]
+            index = res[1]
+        return res
+    cached.lookup = lookup
+    return cached
+
+def cacheLookups(res):
+    """Give the variable instructions in res that search the dict stack
+       their own lookup cache. Names addressed to dict 0 are already read
+       directly."""
+    for i, (op, arg) in enumerate(res):
+        if op in (NAME, TAILNAME) and arg[1] in (sLookup, dLookup,
+            shallowLookup):
+            res[i] = (op, (arg[0], lookupCache(arg[1], arg[0])) + arg[2:])
+
+def lookupCacheStats(reset=False):
+    """Return (hits, misses, hit rate) of the lookup caches, optionally
+       starting the counts over."""
+    global cacheHits, cacheMisses
+    total = cacheHits + cacheMisses
+    res = (cacheHits, cacheMisses, cacheHits / total if total else 0.0)
+    if reset:
+        cacheHits = cacheMisses = 0
     return res
 
+def compileValue(value, scope, slots=None):
+    """Return the instruction that executes a single value of a code array.
+
+       slots maps the names of the slot block value is in to their slots."""
+    #value
+    if isinstance(value, (int, float)) or isArray(value):
+        return (PUSH, value)
+    #def and variables in a slot block
+    elif slots is not None and value == 'def':
+        return (OP, slotDef(slots))
+    elif (slots is not None and isinstance(value, str) and value[0] != '/'
+        and value not in operators):
+        return (NAME, (value, slotLookup(slots.get(nameKey(value)), scope),
+            scope, nameKey(value) not in slots and scope == 'static'))
+    #control operator
+    elif value in controlOps:
+        return (controlOps[value], None)
+    #operator specialized once its operand types are seen
+    elif value in operators and operators[value] in specializable:
+        return (ADAPT, [operators[value], 0])
+    #operator
+    elif value in operators:
+        return (OP, operators[value])
+    #name constant
+    elif isinstance(value, str) and value[0] == '/':
+        return (PUSH, value)
+    #variable
+    elif isinstance(value, str):
+        if scope == 'dynamic':
+            lookupFn = shallowLookup if shallowBinding else dLookup
+            return (NAME, (value, lookupFn, scope, False))
+        return (NAME, (value, sLookup, scope, True))
+    else:
+        return (OP, lambda: print('invalid input'))
+
+#type specialized operators
+#times a site may fall back to its generic operator before it stays generic
+maxDeopts = 4
+
+def makeFastBinary(function, t):
+    """Return a handler for a binary operator on two operands of type t.
+
+       It runs without the checks of opBase and returns False, leaving the
+       stack alone, if the operands are not both of type t."""
+    def fast():
+        st = opstack
+        if len(st) >= 2 and type(st[-1]) is t and type(st[-2]) is t:
+            b = st.pop()
+            st[-1] = function(st[-1], b)
+            return True
+        return False
+    return fast
+
+def makeFastDivide(function, t):
+    """Like makeFastBinary, but zero divisors are left to the generic
+       operator so the error leaves the same stack."""
+    def fast():
+        st = opstack
+        if (len(st) >= 2 and type(st[-1]) is t and type(st[-2]) is t and
+            st[-1]):
+            b = st.pop()
+            st[-1] = function(st[-1], b)
+            return True
+        return False
+    return fast
+
+def makeFastNeg(t):
+    """Return a handler for neg on an operand of type t."""
+    def fast():
+        st = opstack
+        if st and type(st[-1]) is t:
+            st[-1] = -st[-1]
+            return True
+        return False
+    return fast
+
+#(operator, operand type):specialized handler
+fastOps = {}
+for t in (int, float):
+    fastOps[(add, t)] = makeFastBinary(operator.add, t)
+    fastOps[(sub, t)] = makeFastBinary(operator.sub, t)
+    fastOps[(mul, t)] = makeFastBinary(operator.mul, t)
+    fastOps[(div, t)] = makeFastDivide(operator.truediv, t)
+    fastOps[(mod, t)] = makeFastDivide(operator.mod, t)
+    fastOps[(lt, t)] = makeFastBinary(operator.lt, t)
+    fastOps[(gt, t)] = makeFastBinary(operator.gt, t)
+    fastOps[(eq, t)] = makeFastBinary(operator.eq, t)
+    fastOps[(neg, t)] = makeFastNeg(t)
+
+#operators with specialized handlers
+specializable = {function for function, t in fastOps}
+
+def specialize(function, st):
+    """Return the specialized handler of function for the operands on st, None
+       if there is none."""
+    if not st:
+        return None
+    t = type(st[-1])
+    if function is not neg and (len(st) < 2 or type(st[-2]) is not t):
+        return None
+    return fastOps.get((function, t))
+
+def instruction(code, pc):
+    """Return the instruction at pc, the first instruction of a compiled run
+       for SEG instructions."""
+    op, arg = code[pc]
+    return arg[1] if op == SEG else (op, arg)
+
+def opFunction(op, arg):
+    """Return the operator function an OP, ADAPT or SPEC instruction calls."""
+    if op == OP:
+        return checkedOps.get(arg, arg)
+    elif op == ADAPT:
+        return arg[0]
+    elif op == SPEC:
+        return arg[1]
+
+def forRange(init, incr, final):
+    """Return an iterator over the inclusive range used by for."""
+    #make range inclusive
+    if incr > 0:
+        end = final + 1
+    else:
+        end = final - 1
+    return iter(range(init, end, incr))
+
+def execute(code, scope):
+    """Execute code compiled with compileSPS().
+
+       Procedure calls and code blocks run by control operators are tracked
+       on an explicit control stack, so SPS recursion does not use the
+       Python stack."""
+    st = opstack
+    #saved (code, pc, kind, loop iterator or dict use of the call) of
+    #suspended code
+    frames = []
+    #iterators of running inline loops
+    loops = []
+    count = opcodeCounter() if opcodeCounter is not None else None
+    pc = 0
+    while True:
+        op, arg = code[pc]
+        if count is not None:
+            count(code, pc, op, arg)
+        pc += 1
+        if op == OP:
+            arg()
+        elif op == PUSH:
+            st.append(arg)
+        elif op == SPEC:
+            #deoptimize if the operand types changed
+            if not arg[0]():
+                code[pc-1] = (ADAPT, [arg[1], arg[2] + 1])
+                arg[1]()
+        elif op == SEG:
+            pc = arg[0](st)
+        elif op == ADAPT:
+            fast = None
+            if arg[1] < maxDeopts:
+                fast = specialize(arg[0], st)
+            if fast is not None:
+                code[pc-1] = (SPEC, (fast, arg[0], arg[1]))
+                #zero divisors are left to the generic operator
+                if not fast():
+                    arg[0]()
+            else:
+                #give up on sites whose types keep changing
+                arg[1] += 1
+                if arg[1] >= maxDeopts:
+                    code[pc-1] = (OP, arg[0])
+                arg[0]()
+        elif op == NAME:
+            lookupVal, slink = arg[1](arg[0])
+            #check variable exists
+            if lookupVal:
+                #codeblock
+                if isProcedure(lookupVal):
+                    #run the body of small procedures in place of the call
+                    if arg[3] and slink == 0 and inlineCall(code, pc - 1,
+                        lookupVal):
+                        pc -= 1
+                        continue
+                    #pure procedures called on operands they ran on before
+                    #push the results they left then
+                    if memoSize is not None:
+                        record = memoCall(lookupVal, st)
+                        if record is True:
+                            continue
+                        if record is not None:
+                            frames.append((code, pc, MEMO, record))
+                            code, pc = memoReturn, 0
+                    callee = compileSPS(lookupVal, scope)
+                    use = dictUse(callee)
+                    #procedures that define nothing run without a dict
+                    if use == NODICT and (scope == 'dynamic' or
+                        slink == len(dictstack) - 1):
+                        frames.append((code, pc, NOFRAME, None))
+                    #push new dict and run the procedure
+                    else:
+                        dictPush(newFrame(), slink)
+                        frames.append((code, pc, CALL, use))
+                    code = callee
+                    pc = 0
+                #value
+                else:
+                    st.append(lookupVal)
+            #a name that pushes nothing breaks the analysis of the memoized
+            #calls that are running
+            elif memoActive:
+                poisonMemos()
+        elif op == TAILNAME:
+            lookupVal, slink = arg[1](arg[0])
+            if lookupVal:
+                if isProcedure(lookupVal):
+                    if arg[3] and slink == 0 and inlineCall(code, pc - 1,
+                        lookupVal):
+                        pc -= 1
+                        continue
+                    callee = compileSPS(lookupVal, scope)
+                    use = dictUse(callee)
+                    lazy = use == NODICT and (scope == 'dynamic' or
+                        slink == len(dictstack) - 1)
+                    kind = frames[-1][2] if frames else None
+                    #the returning procedure has no dict to drop
+                    if kind == NOFRAME:
+                        if not lazy:
+                            dictPush(newFrame(), slink)
+                            frames[-1] = frames[-1][:2] + (CALL, use)
+                    #reuse the frame of the returning procedure if the callee
+                    #can not see it
+                    elif kind == CALL and canDropFrame(slink, arg[2]):
+                        replaceFrame(slink, frames[-1][3] != ANYDICT)
+                        frames[-1] = frames[-1][:2] + (CALL, use)
+                    elif lazy:
+                        frames.append((code, pc, NOFRAME, None))
+                    else:
+                        dictPush(newFrame(), slink)
+                        frames.append((code, pc, CALL, use))
+                    code = callee
+                    pc = 0
+                else:
+                    st.append(lookupVal)
+            elif memoActive:
+                poisonMemos()
+        elif op == NEXT:
+            site = arg[1]
+            #run the compiled trace until the loop ends or a guard fails
+            if site.trace is not None:
+                resume = site.trace(st, loops[-1])
+                if resume is None:
+                    loops.pop()
+                    pc = arg[0]
+                else:
+                    site.exits += 1
+                    if site.exits > maxTraceExits:
+                        site.trace = None
+                    pc = resume
+                continue
+            x = next(loops[-1], done)
+            if x is done:
+                loops.pop()
+                pc = arg[0]
+            else:
+                st.append(x)
+                site.iterations += 1
+                if site.iterations == traceThreshold:
+                    pc = recordTrace(site, code, pc, st)
+        elif op == JUMP:
+            pc = arg
+        elif op == IFNOT:
+            if len(st) >= 1 and isinstance(st[-1], bool):
+                if not st.pop():
+                    pc = arg[0]
+            else:
+                #let psIf report the error
+                st.append(arg[1])
+                psIf()
+                pc = arg[0]
+        elif op == IFELSE:
+            if len(st) >= 1 and isinstance(st[-1], bool):
+                if not st.pop():
+                    pc = arg[0]
+            else:
+                st.append(arg[2])
+                st.append(arg[3])
+                psIfelse()
+                pc = arg[1]
+        elif op == FORPREP:
+            if (len(st) >= 3 and isinstance(st[-1], int) and
+                isinstance(st[-2], int) and isinstance(st[-3], int)):
+                final = st.pop()
+                incr = st.pop()
+                loops.append(forRange(st.pop(), incr, final))
+                #run a copy of the loop with its invariant lookups hoisted
+                hoisted = None
+                if arg[2]:
+                    hoisted = hoistLoop(arg[1], 'for', loops[-1], scope)
+                if hoisted is not None:
+                    frames.append((code, arg[0], BLOCK, None))
+                    code = hoisted
+                    pc = 1
+            else:
+                st.append(arg[1])
+                psFor()
+                pc = arg[0]
+        elif op == FORALLPREP:
+            if len(st) >= 1 and isIntArray(st[-1]):
+                loops.append(iter(st.pop()))
+                hoisted = None
+                if arg[2]:
+                    hoisted = hoistLoop(arg[1], 'forall', loops[-1], scope)
+                if hoisted is not None:
+                    frames.append((code, arg[0], BLOCK, None))
+                    code = hoisted
+                    pc = 1
+            else:
+                st.append(arg[1])
+                forAll()
+                pc = arg[0]
+        elif op == END:
+            if not frames:
+                return
+            kind = frames[-1][2]
+            #next loop iteration
+            if kind == LOOP:
+                x = next(frames[-1][3], done)
+                if x is not done:
+                    st.append(x)
+                    pc = 0
+                    continue
+            code, pc, kind, it = frames.pop()
+            if kind == CALL:
+                releaseFrame(it != ANYDICT)
+            elif kind == MEMO:
+                memoStore(it, st)
+        elif op == EXECIF:
+            if (len(st) >= 2 and isinstance(st[-2], bool) and
+                isProcedure(st[-1])):
+                block = st.pop()
+                if st.pop():
+                    frames.append((code, pc, BLOCK, None))
+                    code = compileSPS(block, scope)
+                    pc = 0
+            else:
+                psIf()
+        elif op == EXECIFELSE:
+            if (len(st) >= 3 and isinstance(st[-3], bool) and
+                isArray(st[-2]) and isArray(st[-1])):
+                blockB = st.pop()
+                blockA = st.pop()
+                frames.append((code, pc, BLOCK, None))
+                code = compileSPS(blockA if st.pop() else blockB, scope)
+                pc = 0
+            else:
+                psIfelse()
+        elif op == EXECFOR:
+            if (len(st) >= 4 and isinstance(st[-4], int) and
+                isinstance(st[-3], int) and isinstance(st[-2], int) and
+                isProcedure(st[-1])):
+                block = st.pop()
+                final = st.pop()
+                incr = st.pop()
+                it = forRange(st.pop(), incr, final)
+                code, pc = startLoop(frames, code, pc, it, block, scope)
+            else:
+                psFor()
+        elif op == EXECFORALL:
+            if len(st) >= 2 and isIntArray(st[-2]) and isProcedure(st[-1]):
+                block = st.pop()
+                it = iter(st.pop())
+                code, pc = startLoop(frames, code, pc, it, block, scope)
+            else:
+                forAll()
+
+def canDropFrame(slink, scope):
+    """Return true if the top dict can be popped before calling a procedure
+    found at dictstack index slink without changing any lookup."""
+    #static: the callee's chain starts below the top dict
+    if scope == 'static':
+        return slink < len(dictstack) - 1
+    #dynamic: the callee searches every dict, so only drop an empty one
+    return not dictstack[-1][0]
+
+#operators that use the dict of the call they run in
+dictOps = {psDef, stack}
+#operators that change which dict is on top
+scopeOps = {begin, end}
+#control operators whose code blocks are only known at runtime
+execOps = {EXECIF, EXECIFELSE, EXECFOR, EXECFORALL}
+
+def dictUse(code):
+    """Return how compiled code uses the dict of its call, see NODICT.
+
+       The result is kept as the arg of the END the code ends with."""
+    use = code[-1][1]
+    if use is None:
+        use = NODICT
+        for pc in range(len(code)):
+            op, arg = instruction(code, pc)
+            function = opFunction(op, arg)
+            if op in execOps or function in scopeOps:
+                use = ANYDICT
+                break
+            elif function in dictOps:
+                use = OWNDICT
+        code[-1] = (END, use)
+    return use
+
+#emptied dicts of returned calls kept for later calls
+freeFrames = []
+maxFreeFrames = 64
+
+def newFrame():
+    """Return an empty dict for a call."""
+    return freeFrames.pop() if freeFrames else {}
+
+def releaseFrame(reuse):
+    """Pop the dict of a returning call, keeping it for later calls if reuse
+       is true."""
+    d = dictPop()[0]
+    if reuse and len(freeFrames) < maxFreeFrames:
+        d.clear()
+        freeFrames.append(d)
+
+def startLoop(frames, code, pc, it, block, scope):
+    """Suspend code and return the (code, pc) that runs the first loop pass.
+
+       Returns code and pc unchanged if the loop is empty."""
+    x = next(it, done)
+    if x is done:
+        return code, pc
+    frames.append((code, pc, LOOP, it))
+    opstack.append(x)
+    return compileSPS(block, scope), 0
+
 #interprets code arrays
-def interpretSPS(code, scope):
+def interpretSPS(code, scope, cache=True):
     """Executes code arrays created with parse()."""
-    operators = {'add':add, 'sub':sub, 'mul':mul, 'div':div, 'mod':mod,
-    'lt':lt, 'gt':gt, 'eq':eq, 'neg':neg, 'put':put, 'length':length,
-    'get':get, 'and':psAnd, 'or':psOr, 'not':psNot, 'dup':dup, 'exch':exch,
-    'pop':pop, 'copy':copy, 'clear':clear, 'stack':stack, '=':popPrint,
-    'count':count, 'def':psDef, 'if':psIf, 'ifelse':psIfelse, 'for':psFor,
-    'forall':forAll}
-
     #set gscope for branch operators
     global gscope
     gscope = scope
+    execute(compileSPS(code, scope, cache), scope)
+
+def loadSPS(code, scope):
+    """Compile a top level program for the current operand stack and warn
+       about code that will underflow it."""
+    entry = stackState(opstack)
+    res = compileSPS(code, scope, cache=False, entry=entry)
+    checkUnderflow(code, res, entry, scope)
+    return res
+
+def interpreter(s, scope, numStack=False):
+    """Calls necessary functions to execute an SPS input string.
+
+       If numStack is true the program runs on a NumStack, and opstack is a
+       list again when it ends. If memoSize is set, pure procedures are
+       memoized and the memo hits and misses are printed at the end."""
+    if scope != 'static' and scope != 'dynamic':
+        print('invalid scope')
+    else:
+        #the top level program runs once, so it is not cached
+        global gscope, dictVersion, opstack, memoEpoch
+        gscope = scope
+        #blocks left running by an earlier program that failed
+        slotFrames.clear()
+        #callers may have changed dictstack directly
+        dictVersion += 1
+        if memoSize is not None:
+            #forget the memos of earlier programs
+            memoEpoch += 1
+            memoActive.clear()
+            memoStats(True)
+        if not numStack:
+            execute(loadSPS(parse(tokenize(s)), scope), scope)
+        else:
+            items = opstack
+            opstack = NumStack(items)
+            try:
+                execute(loadSPS(parse(tokenize(s)), scope), scope)
+            finally:
+                items[:] = opstack
+                opstack = items
+        if memoSize is not None:
+            print('memo: %d hits, %d misses' % memoStats()[:2])
+
+def benchNumStack(programs=None, n=200, repeat=5):
+    """Return name:(seconds on the list, seconds on a NumStack) to run each
+       program n times in static scope, the best of repeat tries.
+
+       The programs default to the HW5 arithmetic and loop inputs."""
+    import contextlib
+    import io
+    import time
+    global opstack, dictstack
+    if programs is None:
+        programs = {'arithmetic':input6, 'forall':input1, 'if':input3,
+            'for':input4}
+    saved = opstack, dictstack
+    res = {}
+    try:
+        for name, s in programs.items():
+            times = []
+            for numStack in (False, True):
+                best = None
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        for j in range(n):
+                            opstack, dictstack = [], []
+                            interpreter(s, 'static', numStack)
+                    t = time.perf_counter() - start
+                    best = t if best is None else min(best, t)
+                times.append(best)
+            res[name] = tuple(times)
+    finally:
+        opstack, dictstack = saved
+    return res
 
-    #handle each value
+#-------------------------Memoization-------------------------------------
+
+#results kept per pure procedure, None disables memoization
+memoSize = None
+memoHits = 0
+memoMisses = 0
+#bumped when a global read by an analyzed procedure is defined again
+memoEpoch = 0
+#keys of the globals analyzed procedures read
+memoNames = set()
+#ids of the procedures being analyzed
+analyzing = set()
+#[memo, key, stack base, still valid] of the memoized calls that are running
+memoActive = []
+#code memoized calls return to, its END stores their results
+memoReturn = [(END, None)]
+#types of the operands and results a memo holds
+memoTypes = {int, float, bool}
+#effect of a walk that reached a recursive call whose effect is not known yet
+unknownEffect = object()
+
+class Memo:
+    """Purity of a procedure and the results it left for each operands."""
+    __slots__ = ('info', 'free', 'epoch', 'cache')
+
+def walkEffect(items, ctx):
+    """Return (lowest depth, final depth) of the stack, relative to where it
+       starts, when the code array items runs, None if it is not pure, or
+       unknownEffect.
+
+       ctx is [code analyzed, its local names, the globals it reads, its
+       effect if known, true if it calls itself]. Names are assumed to
+       push a value, the calls that run check it."""
+    d = low = 0
+    i = 0
+    while i < len(items):
+        x = items[i]
+        nxt = items[i+1] if i + 1 < len(items) else None
+        t = type(x)
+        if t in memoTypes:
+            d += 1
+        elif isArray(x):
+            #code blocks are only run by if, ifelse, for and forall
+            if t is Procedure and nxt == 'if':
+                effects = [walkEffect(x, ctx), (0, 0)]
+                skip = 2
+            elif (isArray(nxt) and i + 2 < len(items) and
+                items[i+2] == 'ifelse'):
+                effects = [walkEffect(x, ctx), walkEffect(nxt, ctx)]
+                skip = 3
+            elif t is Procedure and nxt in ('for', 'forall'):
+                e = walkEffect(x, ctx)
+                if e is None or e is unknownEffect:
+                    return e
+                d -= 3 if nxt == 'for' else 1
+                low = min(low, d)
+                #each item pushed by the loop is consumed by the block
+                if e[1] != -1:
+                    return None
+                low = min(low, d + 1 + e[0])
+                i += 2
+                continue
+            elif t is Procedure:
+                return None
+            else:
+                d += 1
+                i += 1
+                continue
+            if None in effects:
+                return None
+            known = [e for e in effects if e is not unknownEffect]
+            if not known:
+                return unknownEffect
+            if any(e[1] != known[0][1] for e in known):
+                return None
+            #pop the bool
+            d -= 1
+            low = min(low, d, d + min(e[0] for e in known))
+            d += known[0][1]
+            i += skip
+            continue
+        elif t is not Symbol or x[0] == '/':
+            return None
+        elif x in registry:
+            info = registry[x]
+            if not info.pure or info.nops is None or info.results is None:
+                return None
+            d -= info.nops
+            low = min(low, d)
+            d += info.results
+        elif x.key in ctx[1]:
+            d += 1
+        else:
+            effect = globalEffect(x.key, ctx)
+            if effect is None or effect is unknownEffect:
+                return effect
+            d -= effect[0]
+            low = min(low, d)
+            d += effect[1]
+        i += 1
+    return (low, d)
+
+def globalEffect(key, ctx):
+    """Return (operands, results) of running the global key in the
+       procedure analyzed by ctx, None if it is not pure, or unknownEffect."""
+    ctx[2].add(key)
+    d = dictstack[0][0] if dictstack else {}
+    if key not in d:
+        return None
+    value = d[key]
+    if not value:
+        return (0, 0)
+    elif not isProcedure(value):
+        return (0, 1) if type(value) in memoTypes else None
+    elif value is ctx[0]:
+        ctx[4] = True
+        return ctx[3] or unknownEffect
+    elif id(value) in analyzing:
+        return None
+    memo = memoFor(value)
+    ctx[2].update(memo.free)
+    return (memo.info.nops, memo.info.results) if memo.info.pure else None
+
+def analyzePurity(code):
+    """Return the Memo of the procedure code, which is pure if it only reads
+       its operands and globals, defines nothing but its parameters
+       (/x exch def at its start), prints nothing and leaves the dictstack
+       as it was."""
+    memo = Memo()
+    info = memo.info = OpInfo()
+    info.name = info.function = info.types = info.apply = info.check = None
+    info.pure, info.nops, info.results = False, None, None
+    memo.free, memo.epoch, memo.cache = set(), memoEpoch, OrderedDict()
+    body = list(code)
+    #a dict of its own, n dict begin ... end
+    if (len(body) >= 4 and type(body[0]) is int and body[1] == 'dict' and
+        body[2] == 'begin' and body[-1] == 'end'):
+        body = body[3:-1]
+    names = set()
+    i = 0
+    while (i + 2 < len(body) and type(body[i]) is Symbol and
+        body[i][0] == '/' and body[i+1] == 'exch' and body[i+2] == 'def'):
+        names.add(body[i].key)
+        i += 3
+    params = len(names)
+    ctx = [code, names, memo.free, None, False]
+    analyzing.add(id(code))
+    try:
+        e = walkEffect(body[i:], ctx)
+        if e is not None and e is not unknownEffect and ctx[4]:
+            #walk again with the effect of the recursive calls
+            ctx[3] = (params - min(0, e[0]), e[1] - min(0, e[0]))
+            if walkEffect(body[i:], ctx) != e:
+                e = None
+    finally:
+        analyzing.discard(id(code))
+        memoNames.update(memo.free)
+    if e is not None and e is not unknownEffect:
+        low = min(-params, e[0] - params)
+        info.pure = True
+        info.nops, info.results = -low, e[1] - params - low
+    return memo
+
+def memoFor(code):
+    """Return the Memo of the procedure code, analyzing it if needed."""
+    info = derived(code)
+    memo = info.get('memo') if info is not None else None
+    if memo is not None and memo.epoch == memoEpoch:
+        return memo
+    memo = analyzePurity(code)
+    if info is not None:
+        info['memo'] = memo
+    return memo
+
+def procedureInfo(code):
+    """Return the OpInfo of the procedure code, its operands, results and
+       whether it is pure."""
+    return memoFor(code).info
+
+def memoCall(code, st):
+    """Return True if the results of calling the procedure code on the
+       operands on st are cached and replaced them, otherwise the record to
+       store the results with when the call returns, or None if the call can
+       not be memoized."""
+    global memoHits, memoMisses
+    memo = memoFor(code)
+    info = memo.info
+    #a global it reads may be hidden by a local of the same name
+    if not info.pure or not memo.free.isdisjoint(shadowedNames):
+        return None
+    base = len(st) - info.nops
+    if base < 0:
+        return None
+    key = tuple(st[base:])
+    types = tuple(map(type, key))
+    if not memoTypes.issuperset(types):
+        return None
+    #1 and true are equal but not the same operand
+    key += types
+    results = memo.cache.get(key)
+    if results is not None:
+        memo.cache.move_to_end(key)
+        del st[base:]
+        st.extend(results)
+        memoHits += 1
+        return True
+    memoMisses += 1
+    record = [memo, key, base, True]
+    memoActive.append(record)
+    return record
+
+def memoStore(record, st):
+    """Cache the results of the memoized call of record that returned."""
+    memoActive.pop()
+    memo, key, base, valid = record
+    results = tuple(st[base:])
+    if (valid and len(results) == memo.info.results and
+        memoTypes.issuperset(map(type, results))):
+        memo.cache[key] = results
+        if len(memo.cache) > memoSize:
+            memo.cache.popitem(last=False)
+
+def poisonMemos():
+    """Keep the memoized calls that are running from storing results."""
+    for record in memoActive:
+        record[3] = False
+
+def memoStats(reset=False):
+    """Return (hits, misses, hit rate) of the memoized calls, optionally
+       starting the counts over."""
+    global memoHits, memoMisses
+    total = memoHits + memoMisses
+    res = (memoHits, memoMisses, memoHits / total if total else 0.0)
+    if reset:
+        memoHits = memoMisses = 0
+    return res
+
+#-------------------------Tracing JIT-------------------------------------
+
+#loop iterations before an inline loop body is traced, None disables tracing
+traceThreshold = 50
+
+#guard failures after which a trace is thrown away
+maxTraceExits = 20
+
+#stack values whose types are recorded at the start of a traced iteration
+maxTraceInputs = 8
+
+class LoopSite:
+    """Profile and compiled trace of an inline for/forall loop."""
+    __slots__ = ('next', 'iterations', 'trace', 'exits')
+
+    def __init__(self, next):
+        #index of the loop's NEXT instruction, the body starts after it
+        self.next = next
+        self.iterations = 0
+        self.trace = None
+        self.exits = 0
+
+def numType(types):
+    """Result type of add, sub, mul and mod, None if not numeric."""
+    if not all(t in (int, float, bool) for t in types):
+        return None
+    return float if float in types else int
+
+def divType(types):
+    """Result type of div, None if not numeric."""
+    return float if numType(types) else None
+
+def compareType(types):
+    """Result type of lt, gt and eq, None if not numeric."""
+    return bool if numType(types) else None
+
+def boolType(types):
+    """Result type of and, or and not, None if not boolean."""
+    return bool if all(t is bool for t in types) else None
+
+#operators a trace can contain, function:(operands, result type, expression).
+#Expressions take the operands in push order.
+traceOps = {
+    add:(2, numType, '{0} + {1}'),
+    sub:(2, numType, '{0} - {1}'),
+    mul:(2, numType, '{0} * {1}'),
+    div:(2, divType, '{0} / {1}'),
+    mod:(2, numType, '{0} % {1}'),
+    lt:(2, compareType, '{0} < {1}'),
+    gt:(2, compareType, '{0} > {1}'),
+    eq:(2, compareType, '{0} == {1}'),
+    neg:(1, numType, '-{0}'),
+    psAnd:(2, boolType, '{1} and {0}'),
+    psOr:(2, boolType, '{1} or {0}'),
+    psNot:(1, boolType, 'not {0}'),
+}
+
+#stack shuffles a trace can contain, function:operands
+traceShuffles = {dup:1, exch:2, pop:1}
+
+def recordTrace(site, code, pc, st):
+    """Execute one iteration of the loop body at pc, recording the path taken,
+       and compile it into site.trace.
+
+       Returns the pc the VM continues at. Recording stops early at the
+       first instruction a trace can not contain, which the VM then runs."""
+    #types of the loop value and the stack below it
+    xtype = type(st[-1])
+    inputs = [type(x) for x in reversed(st[-maxTraceInputs-1:-1])]
+    path = []
+    while True:
+        op, arg = instruction(code, pc)
+        function = opFunction(op, arg)
+        if op == JUMP:
+            if arg == site.next:
+                break
+            pc = arg
+        elif op == PUSH and type(arg) in (int, float, bool):
+            st.append(arg)
+            path.append((pc, op, arg, None))
+            pc += 1
+        elif function in traceOps:
+            nops, resultType, expr = traceOps[function]
+            if (len(st) < nops or
+                resultType([type(x) for x in st[-nops:]]) is None):
+                return pc
+            path.append((pc, OP, function, None))
+            function()
+            pc += 1
+        elif function in traceShuffles:
+            if len(st) < traceShuffles[function]:
+                return pc
+            path.append((pc, OP, function, None))
+            function()
+            pc += 1
+        elif op in (IFNOT, IFELSE) and st and type(st[-1]) is bool:
+            cond = st.pop()
+            path.append((pc, op, arg, cond))
+            pc = pc + 1 if cond else arg[0]
+        else:
+            return pc
+    site.trace = compileTrace(site, path, xtype, inputs)
+    return pc
+
+def compileTrace(site, path, xtype, inputs):
+    """Generate a python function running the loop along a recorded path.
+
+       The function takes the operand stack and the loop iterator and runs
+       iterations until the loop ends, returning None. If a guard fails it
+       writes back the stack and returns the pc the VM resumes at. Returns
+       None if the path reads more stack values than were recorded."""
+    body = []
+    #symbolic stack of (expression, type) above the values read from st
+    sym = [('x', xtype)]
+    #number of values read from st, a0 is st[-1], a1 is st[-2]...
+    reads = [0]
+    temps = [0]
+
+    def operand():
+        if sym:
+            return sym.pop()
+        n = reads[0]
+        if n >= len(inputs):
+            raise IndexError('trace reads unrecorded stack value')
+        reads[0] += 1
+        return ('a%d' % n, inputs[n])
+
+    def temp(expr, resultType):
+        name = 't%d' % temps[0]
+        temps[0] += 1
+        body.append('        %s = %s' % (name, expr))
+        sym.append((name, resultType))
+
+    def writeBack(indent):
+        """Statements storing the symbolic stack into st."""
+        pad = ' ' * indent
+        lines = []
+        values = [e for e, t in sym]
+        n = reads[0]
+        for i in range(min(n, len(values))):
+            lines.append('%sst[%d] = %s' % (pad, i - n, values[i]))
+        if len(values) > n:
+            lines.append('%sst.extend((%s,))' % (pad, ', '.join(values[n:])))
+        elif len(values) < n:
+            lines.append('%sdel st[%d:]' % (pad, len(values) - n))
+        return lines
+
+    try:
+        for pc, op, arg, cond in path:
+            if op == PUSH:
+                sym.append((repr(arg), type(arg)))
+            elif op == OP and arg in traceShuffles:
+                if arg is dup:
+                    x = operand()
+                    sym.extend((x, x))
+                elif arg is exch:
+                    top = operand()
+                    lower = operand()
+                    sym.extend((top, lower))
+                else:
+                    operand()
+            elif op == OP:
+                nops, resultType, expr = traceOps[arg]
+                args = [operand() for i in range(nops)][::-1]
+                #let the VM raise the division error
+                if arg in (div, mod):
+                    sym.extend(args)
+                    body.append('        if %s == 0:' % args[1][0])
+                    body.extend(writeBack(12))
+                    body.append('            return %d' % pc)
+                    del sym[-2:]
+                temp(expr.format(*[e for e, t in args]),
+                    resultType([t for e, t in args]))
+            else:
+                #guard the recorded branch, resuming at the other one
+                c = operand()[0]
+                other = arg[0] if cond else pc + 1
+                body.append('        if %s%s:' % ('not ' if cond else '', c))
+                body.extend(writeBack(12))
+                body.append('            return %d' % other)
+    except IndexError:
+        return None
+    body.extend(writeBack(8))
+
+    #guard the length and types of the stack at the start of an iteration
+    n = reads[0]
+    checks = ['type(x) is not %s' % xtype.__name__] + ['type(a%d) is not %s'
+        % (i, inputs[i].__name__) for i in range(n)]
+    src = ['def trace(st, it):', '    for x in it:']
+    if n:
+        src.append('        if len(st) < %d:' % n)
+        src.append('            st.append(x)')
+        src.append('            return %d' % (site.next + 1))
+        src.extend('        a%d = st[%d]' % (i, -i - 1) for i in range(n))
+    src.append('        if %s:' % ' or '.join(checks))
+    src.append('            st.append(x)')
+    src.append('            return %d' % (site.next + 1))
+    src.extend(body)
+    src.append('    return None')
+    namespace = {}
+    exec(compile('\n'.join(src), '<trace>', 'exec'), namespace)
+    return namespace['trace']
+
+#-------------------------Stack effect analysis---------------------------
+
+#Abstract operand stacks are (types, exact) pairs. types are the types of the
+#values known to be on top of the stack in push order, None where the type is
+#not known. If exact is true nothing is below them.
+unknownStack = ((), False)
+
+#operator stack effects, function:(operands, effect). effect takes the operand
+#types in push order and returns the result types if the operator can not fail
+#on them, None if it might.
+stackEffects = {function:(nops, lambda types, resultType=resultType:
+    (resultType(types),) if resultType(types) else None)
+    for function, (nops, resultType, expr) in traceOps.items()}
+stackEffects.update({
+    dup:(1, lambda types: (types[0], types[0])),
+    exch:(2, lambda types: (types[1], types[0])),
+    pop:(1, lambda types: ()),
+    psDef:(2, lambda types: ()),
+    popPrint:(1, lambda types: ()),
+    count:(0, lambda types: (int,)),
+    stack:(0, lambda types: ()),
+    psDict:(1, lambda types: (object,) if numType(types) else None),
+    end:(0, lambda types: ()),
+    length:(1, lambda types: None),
+    get:(2, lambda types: None),
+    put:(3, lambda types: None),
+})
+
+#operands needed by control instructions
+controlOperands = {IFNOT:1, IFELSE:1, FORPREP:3, FORALLPREP:1, EXECIF:2,
+    EXECIFELSE:3, EXECFOR:4, EXECFORALL:2}
+
+def makeUncheckedBinary(function):
+    """Return a binary operator without the checks of opBase."""
+    def unchecked():
+        st = opstack
+        b = st.pop()
+        st[-1] = function(st[-1], b)
+    return unchecked
+
+def uncheckedDef():
+    val = opstack.pop()
+    define(opstack.pop(), val)
+
+def uncheckedExch():
+    st = opstack
+    st[-1], st[-2] = st[-2], st[-1]
+
+#operators without checks, run where the analysis proved they can not fail.
+#div and mod still need the zero check of their specialized handlers.
+uncheckedOps = {
+    add:makeUncheckedBinary(operator.add),
+    sub:makeUncheckedBinary(operator.sub),
+    mul:makeUncheckedBinary(operator.mul),
+    lt:makeUncheckedBinary(operator.lt),
+    gt:makeUncheckedBinary(operator.gt),
+    eq:makeUncheckedBinary(operator.eq),
+    psAnd:makeUncheckedBinary(lambda a, b: b and a),
+    psOr:makeUncheckedBinary(lambda a, b: b or a),
+    neg:lambda: opstack.append(-opstack.pop()),
+    psNot:lambda: opstack.append(not opstack.pop()),
+    dup:lambda: opstack.append(opstack[-1]),
+    exch:uncheckedExch,
+    pop:lambda: opstack.pop(),
+    psDef:uncheckedDef,
+}
+
+#unchecked operator:operator it replaces
+checkedOps = {unchecked:function for function, unchecked in
+    uncheckedOps.items()}
+
+def valueType(value):
+    """Type of value as tracked by the analysis."""
+    return type(value) if type(value) in (int, float, bool) else object
+
+def stackState(st):
+    """Abstract stack holding exactly the values on st."""
+    return (tuple(valueType(x) for x in st), True)
+
+def joinStacks(a, b):
+    """Abstract stack describing both a and b."""
+    (ta, ea), (tb, eb) = a, b
+    n = min(len(ta), len(tb))
+    types = tuple(x if x is y else None for x, y in
+        zip(ta[len(ta)-n:], tb[len(tb)-n:]))
+    return (types, ea and eb and len(ta) == len(tb))
+
+def applyEffect(function, state):
+    """Abstract stack after function runs on state, None if it might fail."""
+    if function is clear:
+        return ((), True)
+    types, exact = state
+    nops, effect = stackEffects.get(function, (None, None))
+    if nops is None or len(types) < nops:
+        return None
+    results = effect(types[len(types)-nops:])
+    if results is None:
+        return None
+    return (types[:len(types)-nops] + results, exact)
+
+def stackSuccessors(code, pc, state, calls=None):
+    """Return (pc, abstract stack) for each instruction that can run after
+       the one at pc when it starts on state.
+
+       calls maps instruction indexes of NAME instructions to the code of
+       the procedure they are known to call."""
+    op, arg = instruction(code, pc)
+    types, exact = state
+    if op == PUSH:
+        return [(pc + 1, (types + (valueType(arg),), exact))]
+    elif op in (OP, ADAPT, SPEC):
+        after = applyEffect(opFunction(op, arg), state)
+        return [(pc + 1, after or unknownStack)]
+    elif op in (NAME, TAILNAME) and calls and pc in calls:
+        callee = analyzeStack(calls[pc], state)[-1]
+        return [(pc + 1, callee or unknownStack)]
+    elif op == JUMP:
+        return [(arg, state)]
+    elif op in (IFNOT, IFELSE) and types and types[-1] is bool:
+        return [(pc + 1, (types[:-1], exact)), (arg[0], (types[:-1], exact))]
+    elif (op == FORPREP and len(types) >= 3 and
+        all(t in (int, bool) for t in types[-3:])):
+        return [(pc + 1, (types[:-3], exact))]
+    elif op in (IFNOT, IFELSE, FORPREP, FORALLPREP):
+        #the checks might fail, leaving the operators to print the error
+        return [(pc + 1, unknownStack)] + [(target, unknownStack) for target in
+            arg[:2] if isinstance(target, int)]
+    elif op == NEXT:
+        x = int if code[pc-1][0] == FORPREP else None
+        return [(pc + 1, (types + (x,), exact)), (arg[0], state)]
+    elif op == END:
+        return []
+    return [(pc + 1, unknownStack)]
+
+def analyzeStack(code, entry=unknownStack, calls=None):
+    """Return the abstract stack before each instruction of compiled code,
+       None for unreachable instructions."""
+    states = [None] * len(code)
+    states[0] = entry
+    work = [0]
+    while work:
+        pc = work.pop()
+        for nxt, state in stackSuccessors(code, pc, states[pc], calls):
+            if states[nxt] is not None:
+                state = joinStacks(states[nxt], state)
+            if state != states[nxt]:
+                states[nxt] = state
+                work.append(nxt)
+    return states
+
+def removeChecks(code, entry=unknownStack):
+    """Replace operators that can not fail with their unchecked versions."""
+    for pc, state in enumerate(analyzeStack(code, entry)):
+        op, arg = code[pc]
+        function = opFunction(op, arg)
+        if (state is not None and function in uncheckedOps and
+            applyEffect(function, state) is not None):
+            code[pc] = (OP, uncheckedOps[function])
+
+def underflows(code, states):
+    """Return the indexes of instructions that always underflow the stack
+       when they run."""
+    res = []
+    for pc, state in enumerate(states):
+        if state is None or not state[1]:
+            continue
+        op, arg = instruction(code, pc)
+        nops = controlOperands.get(op)
+        function = opFunction(op, arg)
+        if function in stackEffects:
+            nops = stackEffects[function][0]
+        if nops is not None and len(state[0]) < nops:
+            res.append(pc)
+    return res
+
+def literalNames(code, res):
+    """Count the name constants in code and its code blocks into res."""
     for value in code:
-        #value
-        if isinstance(value, (int, float, list)):
-            opPush(value)
-        #operator
-        elif value in operators:
-            operators[value]()
-        #name constant
+        if isArray(value):
+            literalNames(value, res)
         elif isinstance(value, str) and value[0] == '/':
-            opPush(value)
-        #variable
-        elif isinstance(value, str):
-            #dynamic scoping
-            if scope == 'dynamic':
-                lookupVal, slink = dLookup(value)
-            #static scoping
-            elif scope == 'static':
-                lookupVal, slink = sLookup(value)
-            #check variable exists
-            if lookupVal:
-                #codeblock
-                if isinstance(lookupVal, list) and not all(isinstance(x, int)
-                    for x in lookupVal):
-                    #push new dict
-                    dictPush({}, slink)
-                    interpretSPS(lookupVal, scope)
-                    #pop dict
-                    dictPop();
-                #value
-                else:
-                    opPush(lookupVal)
+            res[value] = res.get(value, 0) + 1
+    return res
+
+def knownCalls(code, program, scope):
+    """Return NAME instruction index:called code for the top level code of
+       program.
+
+       A name is known to call a procedure if the only place it is defined is
+       a /name {...} def outside of any code block that runs before it."""
+    code = [instruction(code, pc) for pc in range(len(code))]
+    if any(opFunction(op, arg) in (begin, end) for op, arg in code):
+        return {}
+    names = literalNames(program, {})
+    #instructions inside inline code blocks
+    inner = set()
+    for pc, (op, arg) in enumerate(code):
+        if op in (IFNOT, FORPREP, FORALLPREP):
+            inner.update(range(pc + 1, arg[0]))
+        elif op == IFELSE:
+            inner.update(range(pc + 1, arg[1]))
+    defined = {}
+    calls = {}
+    for pc, (op, arg) in enumerate(code):
+        if (opFunction(op, arg) is psDef and pc >= 2 and pc not in inner and
+            code[pc-2][0] == PUSH and code[pc-1][0] == PUSH and
+            isinstance(code[pc-2][1], str) and isProcedure(code[pc-1][1]) and
+            names[code[pc-2][1]] == 1):
+            defined[code[pc-2][1][1:]] = code[pc-1][1]
+        elif op in (NAME, TAILNAME) and arg[0] in defined:
+            calls[pc] = compileSPS(defined[arg[0]], scope)
+    return calls
+
+def checkUnderflow(program, code, entry, scope):
+    """Print a warning to stderr for the top level code and each procedure it
+       calls that will underflow the stack, leaving the program's output as
+       it was."""
+    calls = knownCalls(code, program, scope)
+    states = analyzeStack(code, entry, calls)
+    warned = set()
+    if underflows(code, states):
+        print('warning: program underflows the operand stack', file=sys.stderr)
+    for pc, callee in calls.items():
+        name = code[pc][1][0]
+        if (states[pc] is not None and name not in warned and
+            underflows(callee, analyzeStack(callee, states[pc]))):
+            print('warning: procedure %s underflows the operand stack' % name,
+                file=sys.stderr)
+            warned.add(name)
+
+#-------------------------Stack caching-----------------------------------
+
+#shortest straight-line run compiled into a function, None disables runs
+minRunLength = 2
+
+#operators whose operands must be bools rather than numbers
+boolOps = {psAnd, psOr, psNot}
+
+def runnable(op, arg):
+    """Return true if the instruction can be part of a compiled run."""
+    function = opFunction(op, arg)
+    return (op == PUSH or function in traceOps or function in traceShuffles or
+        function is psDef)
+
+def jumpTargets(code):
+    """Return the indexes code can jump to."""
+    res = set()
+    for op, arg in code:
+        if op == JUMP:
+            res.add(arg)
+        elif op in (IFNOT, FORPREP, FORALLPREP, NEXT):
+            res.add(arg[0])
+        elif op == IFELSE:
+            res.update(arg[:2])
+    return res
+
+def fuses(code, start, pc):
+    """Return true if a superinstruction lets the run starting at start take
+       in the NAME or branch instruction at pc."""
+    for n in range(2, min(pc - start + 1, maxSuperLength) + 1):
+        gram = tuple(opcodeName(*instruction(code, i)) for i in
+            range(pc - n + 1, pc + 1))
+        if gram in superinstructions:
+            return True
+    return False
+
+def compileRuns(code):
+    """Replace the first instruction of each straight-line run of stack and
+       arithmetic instructions with a SEG instruction running the whole run.
+
+       Runs also take in variable loads and end in if or ifelse branches
+       where a superinstruction fuses them with the instructions before.
+       The rest of the run is left in place for when a guard fails part way
+       through it."""
+    if minRunLength is None:
+        return
+    targets = jumpTargets(code)
+    pc = 0
+    while pc < len(code):
+        end = pc
+        while (end < len(code) and (end == pc or end not in targets) and
+            (runnable(*code[end]) or end > pc and
+            code[end][0] in (NAME, IFNOT, IFELSE) and fuses(code, pc, end))):
+            end += 1
+            #a branch ends the run
+            if code[end-1][0] in (IFNOT, IFELSE):
+                break
+        if end - pc >= minRunLength:
+            function, end = compileRun(code, pc, end)
+            if end - pc >= minRunLength:
+                code[pc] = (SEG, (function, code[pc]))
+        pc = max(end, pc + 1)
+
+def compileRun(code, start, end, exit=None):
+    """Generate a python function running code[start:end] with intermediate
+       values in locals.
+
+       The function takes the operand stack, which is only written when the
+       run ends or a guard fails. It returns the pc the VM continues at,
+       exit if given when the run completes.
+       Returns (function, end), where end is moved back if the run contains
+       an operator that always fails."""
+    body = []
+    #symbolic stack of (expression, type) above the values read from st. The
+    #type is None if unknown and 'num' if numeric but not exactly known.
+    sym = []
+    #number of values read from st, a0 is st[-1], a1 is st[-2]...
+    reads = [0]
+    namespace = {'define':define, 'NUMS':(int, float, bool),
+        'isProcedure':isProcedure, 'memoActive':memoActive,
+        'poisonMemos':poisonMemos, 'splitRun':splitRun, 'code':code,
+        'first':opFunction(*code[start]) or (lambda: None)}
+
+    def writeBack():
+        """Statements storing the symbolic stack into st."""
+        lines = []
+        values = [e for e, t in sym]
+        n = reads[0]
+        for i in range(min(n, len(values))):
+            lines.append('    st[%d] = %s' % (i - n, values[i]))
+        if len(values) > n:
+            lines.append('    st.extend((%s,))' % ', '.join(values[n:]))
+        elif len(values) < n:
+            lines.append('    del st[%d:]' % (len(values) - n))
+        return lines
+
+    def guard(test, pc):
+        """Leave the run to the instruction at pc if test is true."""
+        body.append('    if %s:' % test)
+        if pc == start:
+            #nothing has run yet, let the operator report the error
+            body.append('        first()')
+            body.append('        return %d' % (start + 1))
+        else:
+            body.extend('    ' + line for line in writeBack())
+            body.append('        return %d' % pc)
+
+    def operands(n, pc):
+        """Make sure the top n values are on the symbolic stack."""
+        while len(sym) < n:
+            guard('len(st) < %d' % (reads[0] + 1), pc)
+            name = 'a%d' % reads[0]
+            body.append('    %s = st[%d]' % (name, -reads[0] - 1))
+            reads[0] += 1
+            sym.insert(0, (name, None))
+        return sym[len(sym)-n:]
+
+    for pc in range(start, end):
+        op, arg = code[pc]
+        function = opFunction(op, arg)
+        checked = not (op == OP and arg in checkedOps)
+        if op == PUSH:
+            if type(arg) in (int, float, bool):
+                sym.append((repr(arg), type(arg)))
+            else:
+                name = 'k%d' % pc
+                namespace[name] = arg
+                sym.append((name, object))
+        elif function in traceShuffles:
+            args = operands(traceShuffles[function], pc)
+            if function is dup:
+                sym.append(args[0])
+            elif function is exch:
+                sym[-2:] = args[::-1]
+            else:
+                sym.pop()
+        elif function is psDef:
+            name, value = [e for e, t in operands(2, pc)]
+            del sym[-2:]
+            body.append('    define(%s, %s)' % (name, value))
+        elif op == NAME:
+            #variable, procedure calls are left to the VM
+            namespace['n%d' % pc] = arg
+            name = 'v%d' % pc
+            body.append('    %s = n%d[1](n%d[0])[0]' % (name, pc, pc))
+            #unset and false values push nothing
+            body.append('    if not %s and memoActive:' % name)
+            body.append('        poisonMemos()')
+            guard('not %s' % name, pc + 1)
+            #a call, the run ends before it from now on so the VM is the
+            #only one looking the name up
+            body.append('    if isProcedure(%s):' % name)
+            body.extend('    ' + line for line in writeBack())
+            body.append('        splitRun(code, %d, %d)' % (start, pc))
+            body.append('        return %d' % pc)
+            sym.append((name, None))
+        elif op in (IFNOT, IFELSE):
+            (cond, t), = operands(1, pc)
+            if t not in (bool, None):
+                end = pc
+                break
+            if t is None:
+                guard('type(%s) is not bool' % cond, pc)
+            sym.pop()
+            body.extend(writeBack())
+            body.append('    return %d if %s else %d' % (pc + 1, cond, arg[0]))
+            return compileSource(body, namespace), end
         else:
-            print('invalid input')
+            nops, resultType, expr = traceOps[function]
+            args = operands(nops, pc)
+            types = [t for e, t in args]
+            valid = (bool,) if function in boolOps else (int, float, bool,
+                'num')
+            if any(t not in valid + (None,) for t in types):
+                end = pc
+                break
+            unknown = list(dict.fromkeys(e for e, t in args if t is None))
+            if checked and unknown:
+                if function in boolOps:
+                    test, t = 'type(%s) is not bool', bool
+                else:
+                    test, t = 'type(%s) not in NUMS', 'num'
+                guard(' or '.join(test % e for e in unknown), pc)
+                #the guard also covers copies still on the stack
+                sym[:] = [(e, t if e in unknown else et) for e, et in sym]
+            #let the operator raise the division error
+            if function in (div, mod):
+                guard('not %s' % args[1][0], pc)
+            if all(t in (int, float, bool) for t in types):
+                t = resultType(types)
+            else:
+                t = {numType:'num', divType:float, compareType:bool,
+                    boolType:bool}[resultType]
+            del sym[len(sym)-nops:]
+            name = 't%d' % pc
+            body.append('    %s = %s' % (name, expr.format(*[e for e, t in
+                args])))
+            sym.append((name, t))
+    body.extend(writeBack())
+    body.append('    return %d' % (end if exit is None else exit))
+    return compileSource(body, namespace), end
+
+def splitRun(code, start, pc):
+    """End the run starting at start before the NAME at pc, which found a
+       procedure. The run is dropped if what is left is too short."""
+    op, arg = code[start]
+    #another call of the run split it already
+    if op != SEG:
+        return
+    code[start] = arg[1]
+    if pc - start >= minRunLength:
+        function, end = compileRun(code, start, pc)
+        if end - start >= minRunLength:
+            code[start] = (SEG, (function, arg[1]))
+
+def compileSource(body, namespace):
+    """Return the run function with the statements in body."""
+    src = ['def run(st):'] + body
+    exec(compile('\n'.join(src), '<run>', 'exec'), namespace)
+    return namespace['run']
+
+#-------------------------Superinstructions-------------------------------
+
+#names of opcodes in superinstructions, operators go by their SPS name
+opcodeNames = {PUSH:'PUSH', NAME:'NAME', JUMP:'JUMP', IFNOT:'IFNOT',
+    IFELSE:'IFELSE', FORPREP:'FORPREP', FORALLPREP:'FORALLPREP', NEXT:'NEXT',
+    EXECIF:'EXECIF', EXECIFELSE:'EXECIFELSE', EXECFOR:'EXECFOR',
+    EXECFORALL:'EXECFORALL', END:'END', TAILNAME:'TAILNAME'}
+
+#instruction sequences fused into compiled runs besides the stack and
+#arithmetic instructions runs always contain. Built with
+#buildSuperinstructions() from profiles of the HW5 test programs in both
+#scopes.
+superinstructions = {
+    ('gt', 'IFNOT'), ('PUSH', 'gt', 'IFNOT'), ('def', 'NAME'),
+    ('lt', 'IFNOT'), ('PUSH', 'lt', 'IFELSE'), ('PUSH', 'lt', 'IFNOT'),
+    ('lt', 'IFELSE'), ('NAME', 'NAME'),
+}
+
+#longest superinstruction
+maxSuperLength = max(len(gram) for gram in superinstructions)
+
+#function profileOpcodes() sets, called at the start of each execute() to
+#get the function called with (code, pc, op, arg) of every instruction it
+#fetches
+opcodeCounter = None
+
+def opcodeName(op, arg):
+    """Return the name of an instruction used in superinstructions."""
+    function = opFunction(op, arg)
+    if function in operatorNames:
+        return operatorNames[function]
+    return opcodeNames.get(op)
+
+def profileOpcodes(programs, scope, n=3):
+    """Run SPS programs and return how often each sequence of 2 to n
+       instructions ran one after another in the same code.
+
+       Runs and traces are turned off so the counts are of the plain
+       instructions. The programs are parsed afresh, so none of their code
+       was compiled with them on. The stacks are put back afterwards."""
+    import contextlib
+    import io
+    global minRunLength, traceThreshold, opcodeCounter
+    counts = {}
+
+    def record(names):
+        for k in range(2, len(names) + 1):
+            gram = tuple(names[-k:])
+            counts[gram] = counts.get(gram, 0) + 1
+
+    def counter():
+        #(code, pc, names of the instructions ran in a row) of this execute()
+        last = [None, None, []]
+
+        def count(code, pc, op, arg):
+            names = []
+            if last[0] is code and last[1] == pc - 1:
+                names = last[2][1-n:]
+                #the variable before was a value rather than a call
+                if names[-1] == 'NAME':
+                    record(names)
+            names.append(opcodeName(op, arg))
+            last[:] = code, pc, names
+            if names[-1] != 'NAME':
+                record(names)
+        return count
+
+    saved = minRunLength, traceThreshold
+    stacks = opstack[:], dictstack[:]
+    minRunLength = traceThreshold = None
+    opcodeCounter = counter
+    try:
+        for program in programs:
+            opstack.clear()
+            dictstack.clear()
+            with contextlib.redirect_stdout(io.StringIO()):
+                interpreter(program, scope)
+    finally:
+        opcodeCounter = None
+        minRunLength, traceThreshold = saved
+        opstack[:], dictstack[:] = stacks
+    return counts
+
+def isFusable(gram):
+    """Return true if gram is a sequence compileRuns() can fuse, the
+       instructions of a run followed by a variable or a branch."""
+    runNames = {'PUSH', 'def'} | {operatorNames[f] for f in traceOps} | {
+        operatorNames[f] for f in traceShuffles}
+    *start, last = gram
+    return (all(name in runNames or name == 'NAME' for name in start) and
+        last in ('NAME', 'IFNOT', 'IFELSE'))
+
+def buildSuperinstructions(counts, size=16):
+    """Return the size most frequent fusable sequences of a profile made by
+       profileOpcodes().
+
+       Sequences of only stack and arithmetic instructions are left out as
+       runs already fuse all of them."""
+    grams = sorted((gram for gram in counts if isFusable(gram)),
+        key=lambda gram: -counts[gram])
+    return set(grams[:size])
+
+#-------------------------Inliner-----------------------------------------
+
+#longest procedure body inlined at its call sites, None disables inlining
+maxInlineSize = 8
+
+#operators an inlined body may not contain since they see the callee's dict
+notInlinedOps = {'def', 'begin', 'end', 'stack'} | set(controlOps)
+
+#name:[(code, pc, NAME instruction)] of call sites running an inlined body
+inlinedSites = {}
+
+
+def isInlinable(proc):
+    """Return true if proc is a small procedure that does the same thing run
+       in the dict of its caller as in its own.
+
+       It may only contain literals and operators that do not use the dict
+       stack."""
+    return maxInlineSize is not None and len(proc) <= maxInlineSize and all(
+        type(value) in (int, float, bool) or isIntArray(value) or
+        isinstance(value, str) and (value[0] == '/' or value in operators and
+        value not in notInlinedOps) for value in proc)
+
+def inlineCall(code, pc, proc):
+    """Run the body of proc in place of the static scope call to it at pc.
+
+       The call must find proc in dict 0 with no other dict on the stack
+       defining its name. The body is appended to code followed by a jump
+       back, and the call becomes a compiled run of it when the whole body
+       can be one. Returns False if the call can not be inlined."""
+    op, arg = code[pc]
+    name = nameKey(arg[0])
+    if not isInlinable(proc):
+        #do not try this call again
+        code[pc] = (op, arg[:3] + (False,))
+        return False
+    if any(name in d for d, chain in dictstack[1:]):
+        return False
+    start = len(code)
+    code.extend(compileValue(value, 'static') for value in optimize(proc))
+    code.append((JUMP, pc + 1))
+    inline = (JUMP, start)
+    if all(runnable(*x) for x in code[start:-1]) and len(code) - start > 1:
+        function, end = compileRun(code, start, len(code) - 1, pc + 1)
+        if end == len(code) - 1:
+            inline = (SEG, (function, inline))
+    code[pc] = inline
+    inlinedSites.setdefault(name, []).append((code, pc, (op, arg)))
+    return True
 
-def interpreter(s, scope):
-    """Calls necessary functions to execute an SPS input string."""
+def uninline(name):
+    """Turn the inlined calls to name back into calls, the name is being
+       redefined or hidden. The calls are not inlined again."""
+    for code, pc, (op, arg) in inlinedSites.pop(name):
+        code[pc] = (op, arg[:3] + (False,))
+        #traces may have recorded the inlined body
+        for op, arg in code:
+            if op == NEXT:
+                arg[1].trace = None
+                arg[1].iterations = 0
+
+#-------------------------Loop invariant hoisting-------------------------
+
+#iterations a loop must have for its invariant variables to be hoisted, None
+#disables hoisting
+hoistThreshold = 16
+
+#hoisted loops kept per loop body before its cache is emptied. The names of
+#a body's variables and its hoisted loops, (scope, optLevel, variable
+#values):compiled loop, are kept on the body, see derived().
+maxHoistedLoops = 256
+
+def loopVariables(block, scope):
+    """Return the names of the variables used by a loop body, None if the body
+       can change what they refer to.
+
+       The body can not use def, begin or end, or run code blocks that are
+       not literals of the body."""
+    info = derived(block)
+    if info is not None and 'variables' in info:
+        return info['variables']
+    code = compileSPS(block, scope)
+    names = set()
+    for pc in range(len(code)):
+        op, arg = instruction(code, pc)
+        if (op in (EXECIF, EXECIFELSE, EXECFOR, EXECFORALL) or
+            opFunction(op, arg) in (psDef, begin, end)):
+            names = None
+            break
+    if names is not None:
+        variableNames(block, names)
+    if info is not None:
+        info['variables'] = names
+    return names
+
+def variableNames(code, res):
+    """Add the variables used in code and its code blocks to res."""
+    for value in code:
+        if isArray(value):
+            variableNames(value, res)
+        elif (isinstance(value, str) and value[0] != '/' and
+            value not in operators):
+            res.add(value)
+
+def peekName(name, scope):
+    """Return (True, value) for the value lookup would find for name, or
+       (False, None) without printing an error if there is none."""
+    key = nameKey(name)
+    if scope == 'dynamic':
+        for d, chain in reversed(dictstack):
+            if key in d:
+                return (True, d[key])
+        return (False, None)
+    i = len(dictstack) - 1
+    while i >= 0:
+        d, chain = dictstack[i]
+        if key in d:
+            return (True, d[key])
+        if i == chain:
+            break
+        i = chain
+    return (False, None)
+
+def substitute(code, values):
+    """Return a copy of code with the variables in values replaced by their
+       values. False values are dropped since looking them up pushes nothing.
+
+       Code blocks run by if, for and forall are copied too, other code blocks
+       are left alone as they can end up on the stack."""
+    res = []
+    for i, value in enumerate(code):
+        nxt = code[i+1] if i + 1 < len(code) else None
+        if isinstance(value, str) and value in values:
+            if values[value]:
+                res.append(values[value])
+        elif isProcedure(value) and nxt in ('if', 'for', 'forall'):
+            res.append(substitute(value, values))
+        else:
+            res.append(value)
+    #stays code even when every item is now an int
+    return Procedure(res)
+
+def hoistLoop(block, kind, it, scope):
+    """Return compiled code for the inline loop block kind, kind being for or
+       forall, with the numbers and bools it looks up replaced by their values
+       and folded. None if the loop is too short or has nothing to hoist.
+
+       The code starts with the loop's prep instruction followed by its NEXT
+       instruction, where the caller starts it on the loop iterator it."""
+    if hoistThreshold is None or operator.length_hint(it) < hoistThreshold:
+        return None
+    names = loopVariables(block, scope)
+    if not names:
+        return None
+    values = {}
+    for name in names:
+        found, value = peekName(name, scope)
+        #errors and procedure calls stay in the loop
+        if not found or isProcedure(value):
+            return None
+        if type(value) in (int, float, bool):
+            values[name] = value
+    if not values:
+        return None
+    key = (scope, optLevel, tuple((name, type(value), value) for
+        name, value in sorted(values.items())))
+    info = derived(block)
+    hoisted = info.setdefault('hoisted', {}) if info is not None else {}
+    if key in hoisted:
+        return hoisted[key]
+    code = compileSPS([substitute(block, values), kind], scope, cache=False)
+    if len(hoisted) >= maxHoistedLoops:
+        hoisted.clear()
+    hoisted[key] = code
+    return code
+
+#-------------------------Transpiler--------------------------------------
+
+#bump when generated modules change so stale disk caches are not reused
+transpilerVersion = 4
+
+#transpiled calls nested deeper than this run on the VM instead, which does
+#not use the Python stack
+maxTranspiledDepth = 200
+
+#binary operators inlined by the transpiler and their python operators
+inlineBinary = {'add':'+', 'sub':'-', 'mul':'*', 'div':'/', 'mod':'%',
+    'lt':'<', 'gt':'>', 'eq':'=='}
+
+#other inlined operators, (check, statements). The operator function runs
+#instead when the check fails so errors are reported the same way.
+inlineOps = {
+    'neg':('st and type(st[-1]) in NUMS', ['st[-1] = -st[-1]']),
+    'dup':('st', ['st.append(st[-1])']),
+    'exch':('len(st) >= 2', ['st[-1], st[-2] = st[-2], st[-1]']),
+    'pop':('st', ['st.pop()']),
+    'and':('len(st) >= 2 and type(st[-1]) is bool and type(st[-2]) is bool',
+        ['b = st.pop()', 'st[-1] = b and st[-1]']),
+    'or':('len(st) >= 2 and type(st[-1]) is bool and type(st[-2]) is bool',
+        ['b = st.pop()', 'st[-1] = b or st[-1]']),
+    'not':('st and type(st[-1]) is bool', ['st[-1] = not st[-1]']),
+    'length':('st and isinstance(st[-1], ps.array)',
+        ['st[-1] = len(st[-1])']),
+    'def':('len(st) >= 2', ['b = st.pop()', 'ps.define(st.pop(), b)']),
+}
+
+#start of every generated module, call() mirrors the NAME instruction.
+#build() makes the program's constants from the runtime's types the first
+#time the module runs.
+transpiledHeader = '''\
+NUMS = {int, float, bool}
+depth = 0
+ps = None
+
+def call(name):
+    global depth
+    lookupVal, slink = LOOKUP(name)
+    if lookupVal:
+        if ps.isProcedure(lookupVal):
+            ps.dictPush({}, slink)
+            fn = FUNCS.get(id(lookupVal))
+            if fn is not None and depth < ps.maxTranspiledDepth:
+                depth += 1
+                try:
+                    fn()
+                finally:
+                    depth -= 1
+            else:
+                ps.execute(ps.compileSPS(lookupVal, SCOPE), SCOPE)
+            ps.dictPop()
+        else:
+            ps.opstack.append(lookupVal)
+
+def run(runtime):
+    global ps, LOOKUP
+    if ps is not runtime:
+        ps = runtime
+        build()
+    ps.gscope = SCOPE
+    LOOKUP = ps.dLookup if SCOPE == 'dynamic' else ps.sLookup
+    main()
+'''
+
+def transpile(program, scope):
+    """Return the source of a python module equivalent to a program created
+       with parse().
+
+       The module's run(runtime) executes the program against the stacks of
+       the runtime module, honouring scope like interpreter()."""
+    #id(value):name of the constants holding each array and name, built
+    #from the runtime's Procedure, PSArray and symbol() so the transpiled
+    #code runs on the same types as parsed code
+    consts = {}
+    defs = []
+    def literal(value):
+        if isinstance(value, str):
+            if id(value) not in consts:
+                consts[id(value)] = 'S%d' % len(defs)
+                build = 'ps.symbol(%r)' if type(value) is Symbol else '%r'
+                defs.append((consts[id(value)], build % str(value), value))
+            return consts[id(value)]
+        if not isArray(value):
+            return repr(value)
+        if id(value) not in consts:
+            items = ', '.join(literal(x) for x in value)
+            if type(value) in (Procedure, PSArray):
+                build = 'ps.%s([%s])' % (type(value).__name__, items)
+            else:
+                build = '[%s]' % items
+            consts[id(value)] = 'K%d' % len(defs)
+            defs.append((consts[id(value)], build, value))
+        return consts[id(value)]
+    for value in program:
+        literal(value)
+
+    lines = ['#SPS program transpiled by HW5.transpile()',
+        'SCOPE = %r' % scope, transpiledHeader]
+    #one function per procedure literal
+    funcs = []
+    for name, build, value in defs:
+        if isProcedure(value):
+            funcs.append('id(%s):p%s' % (name, name[1:]))
+            lines.append('def p%s():' % name[1:])
+            lines.append('    st = ps.opstack')
+            transpileBlock(value, consts, lines, 1)
+            lines.append('')
+    lines.append('def build():')
+    lines.append('    global %s, FUNCS' % ', '.join(name for name, build,
+        value in defs))
+    for name, build, value in defs:
+        lines.append('    %s = %s' % (name, build))
+    lines.append('    FUNCS = {%s}' % ', '.join(funcs))
+    lines.append('')
+    lines.append('def main():')
+    lines.append('    st = ps.opstack')
+    transpileBlock(program, consts, lines, 1)
+    return '\n'.join(lines) + '\n'
+
+def transpileBlock(code, consts, lines, indent):
+    """Append python statements executing code to lines."""
+    pad = '    ' * indent
+    start = len(lines)
+    i = 0
+    while i < len(code):
+        value = code[i]
+        nxt = code[i+1] if i + 1 < len(code) else None
+        nxt2 = code[i+2] if i + 2 < len(code) else None
+        #{A} if
+        if isProcedure(value) and isinstance(nxt, str) and nxt == 'if':
+            lines.append(pad + 'if st and type(st[-1]) is bool:')
+            lines.append(pad + '    if st.pop():')
+            transpileBlock(value, consts, lines, indent + 2)
+            lines.append(pad + 'else:')
+            lines.append(pad + '    st.append(%s)' % consts[id(value)])
+            lines.append(pad + '    ps.psIf()')
+            i += 2
+        #{A} {B} ifelse, ifelse also runs integer arrays
+        elif (isArray(value) and isArray(nxt) and
+            isinstance(nxt2, str) and nxt2 == 'ifelse'):
+            lines.append(pad + 'if st and type(st[-1]) is bool:')
+            lines.append(pad + '    if st.pop():')
+            transpileBlock(value, consts, lines, indent + 2)
+            lines.append(pad + '    else:')
+            transpileBlock(nxt, consts, lines, indent + 2)
+            lines.append(pad + 'else:')
+            lines.append(pad + '    st.append(%s)' % consts[id(value)])
+            lines.append(pad + '    st.append(%s)' % consts[id(nxt)])
+            lines.append(pad + '    ps.psIfelse()')
+            i += 3
+        #{A} for
+        elif isProcedure(value) and isinstance(nxt, str) and nxt == 'for':
+            x = 'x%d' % indent
+            lines.append(pad + 'if (len(st) >= 3 and isinstance(st[-1], int)'
+                ' and isinstance(st[-2], int) and isinstance(st[-3], int)):')
+            lines.append(pad + '    final = st.pop()')
+            lines.append(pad + '    incr = st.pop()')
+            lines.append(pad + '    for %s in ps.forRange(st.pop(), incr, '
+                'final):' % x)
+            lines.append(pad + '        st.append(%s)' % x)
+            transpileBlock(value, consts, lines, indent + 2)
+            lines.append(pad + 'else:')
+            lines.append(pad + '    st.append(%s)' % consts[id(value)])
+            lines.append(pad + '    ps.psFor()')
+            i += 2
+        #{A} forall
+        elif isProcedure(value) and isinstance(nxt, str) and nxt == 'forall':
+            x = 'x%d' % indent
+            lines.append(pad + 'if st and ps.isIntArray(st[-1]):')
+            lines.append(pad + '    for %s in st.pop():' % x)
+            lines.append(pad + '        st.append(%s)' % x)
+            transpileBlock(value, consts, lines, indent + 2)
+            lines.append(pad + 'else:')
+            lines.append(pad + '    st.append(%s)' % consts[id(value)])
+            lines.append(pad + '    ps.forAll()')
+            i += 2
+        else:
+            transpileValue(value, consts, lines, pad)
+            i += 1
+    if len(lines) == start:
+        lines.append(pad + 'pass')
+
+def transpileValue(value, consts, lines, pad):
+    """Append python statements executing a single value to lines."""
+    #code array
+    if isArray(value):
+        lines.append(pad + 'st.append(%s)' % consts[id(value)])
+    #value
+    elif isinstance(value, (int, float)):
+        lines.append(pad + 'st.append(%r)' % value)
+    #inlined operator
+    elif value in inlineBinary:
+        lines.append(pad + 'if (len(st) >= 2 and type(st[-1]) in NUMS and '
+            'type(st[-2]) in NUMS):')
+        lines.append(pad + '    b = st.pop()')
+        #div and mod can raise, so pop both operands first like opBase
+        if value in ('div', 'mod'):
+            lines.append(pad + '    a = st.pop()')
+            lines.append(pad + '    st.append(a %s b)' % inlineBinary[value])
+        else:
+            lines.append(pad + '    st[-1] = st[-1] %s b' %
+                inlineBinary[value])
+        lines.append(pad + 'else:')
+        lines.append(pad + '    ps.%s()' % operators[value].__name__)
+    elif value in inlineOps:
+        check, statements = inlineOps[value]
+        lines.append(pad + 'if %s:' % check)
+        for statement in statements:
+            lines.append(pad + '    ' + statement)
+        lines.append(pad + 'else:')
+        lines.append(pad + '    ps.%s()' % operators[value].__name__)
+    #operator
+    elif value in operators:
+        lines.append(pad + 'ps.%s()' % operators[value].__name__)
+    #name constant
+    elif isinstance(value, str) and value[0] == '/':
+        lines.append(pad + 'st.append(%s)' % consts[id(value)])
+    #variable
+    elif isinstance(value, str):
+        lines.append(pad + 'call(%s)' % consts[id(value)])
+    else:
+        lines.append(pad + "print('invalid input')")
+
+def loadTranspiled(s, scope, cacheDir='__spscache__'):
+    """Return the transpiled module for an SPS input string.
+
+       Modules are written to cacheDir and imported from there, so later runs
+       of the same program skip tokenizing, parsing and code generation. If
+       cacheDir is None the module is built in memory with compile()."""
+    import hashlib
+    import importlib.util
+    import os
+    import types
+    name = 'sps_' + hashlib.sha1(('%d %s\n%s' % (transpilerVersion, scope,
+        s)).encode()).hexdigest()
+    if cacheDir is None:
+        module = types.ModuleType(name)
+        source = transpile(parse(tokenize(s)), scope)
+        exec(compile(source, '<%s>' % name, 'exec'), module.__dict__)
+        return module
+    path = os.path.join(cacheDir, name + '.py')
+    if not os.path.exists(path):
+        os.makedirs(cacheDir, exist_ok=True)
+        #write to a temporary file first so readers never see half a module
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'w') as f:
+            f.write(transpile(parse(tokenize(s)), scope))
+        os.replace(tmp, path)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def runTranspiled(s, scope, cacheDir='__spscache__'):
+    """Execute an SPS input string through its transpiled python module."""
     if scope != 'static' and scope != 'dynamic':
         print('invalid scope')
     else:
-        interpretSPS(parse(tokenize(s)), scope)
+        loadTranspiled(s, scope, cacheDir).run(sys.modules[__name__])
 
 #-------------------------TEST FUNCTIONS--------------------------------
 
-import re
 #global variables
 opstack = []  #assuming top of the stack is the end of the list
 dictstack = []  #assuming top of the stack is the end of the list
@@ -1157,7 +4130,7 @@ def testSSPS3():
     dictstack.clear()
     print('SSPS input2 dynamic test:')
     interpreter(sspsInput2, 'dynamic')
-    return opstack == [1, 1, 1, 50, 100] and dictstack == [({'/chic': ['/n',
+    return opstack == [100, 50, 1, 1, 1] and dictstack == [({'/chic': ['/n',
     1, 'def', '/egg2', ['n'], 'def', 'm', 'n', 'egg1', 'egg2', 'stack'], '/n':
     100, '/m': 50, '/egg1': ['/m', 25, 'def', 'n']}, 0)]
 
@@ -1221,6 +4194,546 @@ def testSSPS9():
     return opstack == [4.0] and dictstack == [({'/square': ['dup', 'mul']},
 	0)]
 
+#------------------Compiler test cases---------------------------
+deepInput = """
+    /sum {dup 0 gt {dup 1 sub sum add} if} def
+    30000 sum
+"""
+
+def testDeepRecursion():
+    global opstack
+    global dictstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter(deepInput, 'static')
+    return opstack == [450015000] and dictstack == [({'/sum': ['dup', 0,
+        'gt', ['dup', 1, 'sub', 'sum', 'add'], 'if']}, 0)]
+
+def testDeepRecursion2():
+    global opstack
+    global dictstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter(deepInput.replace('30000', '3000'), 'dynamic')
+    return opstack == [4501500] and len(dictstack) == 1
+
+def testInlineControl():
+    global opstack
+    global dictstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('[1 2 3] {dup 2 lt {pop} {10 mul} ifelse} forall 0 1 1 3 {add}'
+        ' for', 'static')
+    return opstack == [20, 30, 6]
+
+tailInput = """
+    /countdown {dup 0 gt {1 sub countdown} if} def
+    100000 countdown
+"""
+
+def testTailCall():
+    global opstack
+    global dictstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter(tailInput, 'static')
+    return opstack == [0] and len(dictstack) == 1
+
+def testTailCall2():
+    global opstack
+    global dictstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter(tailInput, 'dynamic')
+    return opstack == [0] and len(dictstack) == 1
+
+def testTailCall3():
+    #a name directly before END is compiled as a tail call
+    code = compileSPS(['/x', 2, 'def', '/g', ['x'], 'def', 'g'], 'static',
+        cache=False)
+    return code[-2][0] == TAILNAME and code[-1][0] == END
+
+def testTranspile():
+    global opstack
+    global dictstack
+    for scope in ('static', 'dynamic'):
+        for s in (sspsInput1, sspsInput3, input2, input4, '/x [1 2 3] length '
+            'def true false or not x 2 gt and 1 not'):
+            opstack.clear()
+            dictstack.clear()
+            interpreter(s, scope)
+            expected = (list(opstack), list(dictstack))
+            opstack.clear()
+            dictstack.clear()
+            runTranspiled(s, scope, None)
+            if (list(opstack), list(dictstack)) != expected:
+                return False
+    return True
+
+def testTranspileCache():
+    import os
+    import shutil
+    import tempfile
+    global opstack
+    global dictstack
+    cacheDir = tempfile.mkdtemp()
+    try:
+        opstack.clear()
+        dictstack.clear()
+        runTranspiled(input6, 'static', cacheDir)
+        first = list(opstack)
+        #second run loads the module written by the first
+        opstack.clear()
+        dictstack.clear()
+        runTranspiled(input6, 'static', cacheDir)
+        modules = [f for f in os.listdir(cacheDir) if f.endswith('.py')]
+        return first == [4.0] and opstack == [4.0] and len(modules) == 1
+    finally:
+        shutil.rmtree(cacheDir)
+
+def testTranspileFallback():
+    global opstack, maxTranspiledDepth, compileBlock
+    opstack.clear()
+    dictstack.clear()
+    compiles = []
+    block = compileBlock
+    def counted(code, *args, **kwargs):
+        compiles.append(code)
+        block(code, *args, **kwargs)
+    saved = maxTranspiledDepth
+    #every call runs on the VM
+    maxTranspiledDepth, compileBlock = 0, counted
+    try:
+        runTranspiled('/sq {dup mul} def 2 sq 3 sq [1 2] /x', 'static', None)
+    finally:
+        maxTranspiledDepth, compileBlock = saved, block
+    sq = lookup('sq')
+    return (opstack[:2] == [4, 9] and type(sq) is Procedure and
+        type(opstack[2]) is PSArray and type(opstack[3]) is Symbol and
+        type(sq[0]) is Symbol and compiles == [sq])
+
+traceInput = """
+    0 1 1 1000 {dup mul add} for
+"""
+
+def testTrace():
+    global opstack
+    opstack.clear()
+    code = compileSPS(parse(tokenize(traceInput)), 'static', cache=False)
+    execute(code, 'static')
+    sites = [arg[1] for op, arg in code if op == NEXT]
+    return opstack == [333833500] and sites[0].trace is not None
+
+def testTraceGuard():
+    #the accumulator turns into a float part way through the loop
+    global opstack
+    global traceThreshold
+    s = '0 1 1 200 {dup 120 gt {pop 1 2 div} if add} for'
+    opstack.clear()
+    interpreter(s, 'static')
+    traced = list(opstack)
+    threshold = traceThreshold
+    traceThreshold = None
+    try:
+        opstack.clear()
+        interpreter(s, 'static')
+    finally:
+        traceThreshold = threshold
+    return traced == opstack == [7300.0]
+
+def testSpecialize():
+    global opstack
+    opstack.clear()
+    #without compiled runs, which would take over the operators
+    code = []
+    compileBlock(['dup', 'mul', 1, 'add'], 'static', code)
+    code.append((END, None))
+    opstack.append(3)
+    execute(code, 'static')
+    return opstack == [10] and [op for op, arg in code[:4]] == [OP, SPEC, PUSH,
+        SPEC]
+
+def testDeoptimize():
+    global opstack
+    opstack.clear()
+    code = compileSPS(['add'], 'static', cache=False)
+    results = []
+    for a, b in ((1, 2), (0.5, 0.25), (True, 1), (3, 4)):
+        opstack.append(a)
+        opstack.append(b)
+        execute(code, 'static')
+        results.append(opstack.pop())
+    return results == [3, 0.75, 2, 7] and code[0][0] == SPEC
+
+def testUncheckedOps():
+    global opstack
+    opstack.clear()
+    opstack.extend([2, 3])
+    code = compileSPS(parse(tokenize('add dup mul x add')), 'static',
+        cache=False, entry=stackState(opstack))
+    ops = [instruction(code, pc)[0] for pc in range(len(code))]
+    return (ops[:3] == [OP, OP, OP] and instruction(code, 0)[1] is
+        uncheckedOps[add] and code[4][0] == ADAPT)
+
+def testUnderflowWarning():
+    import contextlib
+    import io
+    global opstack
+    dictstack.clear()
+    opstack.clear()
+    out = io.StringIO()
+    with contextlib.redirect_stderr(out):
+        interpreter('/sq {dup mul} def /inc {1 add} def 2 inc sq sq', 'static')
+        opstack.clear()
+        interpreter('/sq {dup mul} def sq', 'static')
+    return out.getvalue().startswith(
+        'warning: procedure sq underflows the operand stack') and \
+        out.getvalue().count('warning') == 1
+
+def testStackCaching():
+    global opstack
+    opstack.clear()
+    code = compileSPS(['dup', 'mul', 1, 'add'], 'static', cache=False)
+    opstack.append(3)
+    execute(code, 'static')
+    return opstack == [10] and code[0][0] == SEG
+
+def testStackCachingGuard():
+    import contextlib
+    import io
+    global opstack
+    opstack.clear()
+    code = compileSPS(['dup', 'mul', 1, 'add'], 'static', cache=False)
+    opstack.append('/a')
+    with contextlib.redirect_stdout(io.StringIO()):
+        execute(code, 'static')
+    return opstack == ['/a', '/a', 1]
+
+def testRunCallSplit():
+    import contextlib
+    import io
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('/g {/y exch def y y mul} def /f {/x exch def x g x add} def '
+        '3 f', 'static')
+    code = compileSPS(lookup('f'), 'static')
+    #the run stops before g now, so it no longer looks g up
+    del dictstack[0][0]['/g']
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        pc = code[0][1][0]([5])
+    return (opstack == [12] and code[0][0] == SEG and
+        instruction(code, pc)[1][0] == 'g' and out.getvalue() == '')
+
+foldInput = '2 3 add 4 sub 10 mul 2 div 3 mod'
+
+def testOptimize():
+    #x may be a procedure that empties the stack, so exch exch stays
+    return (optimize(parse(tokenize(foldInput))) == [2.0] and
+        optimize(parse(tokenize('1 2 lt {3 x} {4} ifelse exch exch dup pop'
+        ' 5 pop false {y} if'))) == [3, 'x', 'exch', 'exch', 'dup', 'pop'] and
+        optimize(parse(tokenize('3 x 1 2 exch exch dup pop'))) == [3, 'x', 1,
+        2] and optimize(['exch', 'exch'], 2) == [])
+
+def testOptimizeShortStack():
+    import contextlib
+    import io
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        interpreter('/f {exch exch} def /g {dup pop} def 1 f', 'static')
+        opstack.clear()
+        interpreter('g', 'static')
+    return out.getvalue() == ('error: not enough arguments on opstack\n' * 3 +
+        'error: not enough items in opstack\n') and opstack == []
+
+def testOptLevel():
+    global opstack, optLevel
+    results = []
+    for level in (0, 1):
+        optLevel = level
+        opstack.clear()
+        dictstack.clear()
+        interpreter(foldInput + ' 1 2 lt {3 1 add} if'
+            ' /f {1 1 add 3 mul} def f', 'static')
+        results.append(list(opstack))
+    optLevel = 1
+    return results[0] == results[1] == [2.0, 4, 6]
+
+def testSuperinstruction():
+    global opstack
+    opstack.clear()
+    code = compileSPS(['dup', 1, 'gt', [2, 'mul'], 'if'], 'static',
+        cache=False)
+    results = []
+    for x in (5, 0):
+        opstack.append(x)
+        execute(code, 'static')
+        results.append(opstack.pop())
+    #the run ends in the branch
+    return results == [10, 0] and code[0][0] == SEG and code[0][1][0](
+        [5]) == 4
+
+def testProfileOpcodes():
+    global opstack
+    opstack = [7]
+    dictstack.clear()
+    counts = profileOpcodes(['1 1 3 {dup 1 gt {pop} if} for'], 'static')
+    return (counts[('PUSH', 'gt', 'IFNOT')] == 3 and
+        ('PUSH', 'gt', 'IFNOT') in buildSuperinstructions(counts) and
+        opstack == [7] and dictstack == [] and opcodeCounter is None)
+
+def testInline():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('/square {dup mul} def', 'static')
+    code = compileSPS(parse(tokenize('[1 2 3] {square} forall')), 'static',
+        cache=False)
+    execute(code, 'static')
+    inlined = [op for op, arg in code if op in (NAME, TAILNAME)] == []
+    #redefining square calls the new body
+    interpreter('/square {dup dup mul mul} def', 'static')
+    execute(code, 'static')
+    return inlined and opstack == [1, 4, 9, 1, 8, 27]
+
+def testInlineShadowed():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    #the second call finds the square defined by the first iteration
+    interpreter('/square {dup mul} def '
+        '1 1 2 {pop 3 square 0 dict begin /square {neg} def} for', 'static')
+    return opstack == [9, -3]
+
+def testHoistLoop():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('/n 3 def /z 0 def', 'static')
+    block = ['n', 2, 'mul', 'z', 'add', 'add']
+    code = hoistLoop(block, 'for', iter(range(20)), 'static')
+    #n 2 mul is folded and z pushes nothing
+    hoisted = [instruction(code, pc)[1] for pc in range(len(code))
+        if instruction(code, pc)[0] == PUSH] == [6]
+    interpreter('0 1 1 20 {n 2 mul z add add} for', 'dynamic')
+    summed = opstack == [330]
+    #bodies that become all ints are still code
+    opstack.clear()
+    interpreter('/n 5 def 1 1 20 {n} for', 'static')
+    pushed = opstack == [x for i in range(1, 21) for x in (i, 5)]
+    opstack.clear()
+    interpreter('1 1 20 {true {n} if} for', 'static')
+    return (hoisted and summed and pushed and
+        opstack == [x for i in range(1, 21) for x in (i, 5)])
+
+def testHoistLoopDef():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('/n 1 def 0 1 1 20 {n add add /n 2 def} for', 'static')
+    return (hoistLoop(['n', 'add', 'add', '/n', 2, 'def'], 'for',
+        iter(range(20)), 'static') is None and opstack == [1 + 2 * 19 + 210])
+
+def testParseTypes():
+    code = parse(tokenize('{1 2} {dup mul} [1 2 3] { {1} {x} }'))
+    return (type(code[0]) is PSArray and type(code[1]) is Procedure and
+        type(code[2]) is PSArray and type(code[3][0]) is PSArray and
+        type(code[3][1]) is Procedure and code[1] == ['dup', 'mul'] and
+        isProcedure(code[1]) and isIntArray(code[2]) and
+        not isProcedure(code[0]))
+
+def testPutProcedure():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('{dup mul} 0 3 put', 'static')
+    return opstack == [['dup', 'mul'], 0, 3]
+
+def testSymbols():
+    code = parse(tokenize('/x 1 def x x {x} /1x'))
+    return (code[0] is code[3].key and code[3] is code[4] and
+        code[5][0] is code[3] and code[0].valid and not code[3].valid and
+        not code[6].valid and code[0] == '/x')
+
+def testLookupTuples():
+    dictstack.clear()
+    define('/x', 1)
+    dictPush({'/x': 2, '/y': 3}, 0)
+    return (lookup('x') == 2 and lookup('y') == 3 and dLookup('x') == (2, 1)
+        and sLookup('x') == (2, 1) and set(benchLookup((10, 1000), 10)) ==
+        {(10, 'dLookup'), (10, 'sLookup'), (1000, 'dLookup'),
+        (1000, 'sLookup')} and len(dictstack) == 2)
+
+def testLexicalAddress():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    code = parse(tokenize('/y 2 def x y'))
+    ops = compileSPS(code, 'static', cache=False)
+    names = [arg for op, arg in map(instruction, [ops] * len(ops),
+        range(len(ops))) if op in (NAME, TAILNAME)]
+    interpreter('/x 1 def /f {x} def /g {/x 2 def /h {x} def h} def f g f',
+        'static')
+    return (names[0][1] is not sLookup and
+        names[1][1].lookup is sLookup and
+        opstack == [1, 2, 1])
+
+def testShallowBinding():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    interpreter('/x 1 def /f {/x 2 def g} def /g {x} def f x '
+        '1 dict begin /x 3 def x end x '
+        '/t {/x exch def x 1 gt {x 1 sub t} if} def 5 t x', 'dynamic')
+    return (opstack == [2, 1, 3, 1, 1] and shallowLookup('x') ==
+        dLookup('x') and inSync() and bindings['/x'] == [0])
+
+def testLookupCache():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    lookupCacheStats(reset=True)
+    interpreter('/x 1 def /s 1 def /f {x x add} def 0 dict begin f /x 2 def'
+        ' f end f 1 1 10 {pop /s s x add def} for s', 'dynamic')
+    hits, misses, rate = lookupCacheStats()
+    return opstack == [2, 4, 2, 11] and hits >= 18 and rate > 0.5
+
+def testLazyFrames():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    freeFrames.clear()
+    uses = [dictUse(compileSPS(parse(tokenize(s))[0], 'static')) for s in
+        ('{dup mul}', '{/x exch def x}', '{0 dict begin}', '{x {1} if}')]
+    interpreter('/sq {dup mul} def /f {/x exch def x sq} def 3 f 4 sq', 'static')
+    return (uses == [NODICT, OWNDICT, ANYDICT, ANYDICT] and
+        opstack == [9, 16] and len(dictstack) == 1 and len(freeFrames) == 1)
+
+def testSlotBlock():
+    import contextlib
+    import io
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    fact = parse(tokenize('{0 dict begin /n exch def n 2 lt {1} '
+        '{n 1 sub fact n mul} ifelse end}'))[0]
+    ops = [instruction(code, pc) for code in [compileSPS(fact, 'static',
+        cache=False)] for pc in range(len(code))]
+    interpreter('/fact {0 dict begin /n exch def n 2 lt {1} '
+        '{n 1 sub fact n mul} ifelse end} def 5 fact '
+        '/x 7 def /f {/x 1 def 0 dict begin x /x 2 def x end x} def f '
+        '{5 1 add} 0 dict begin /p exch def p end', 'static')
+    stacked = opstack == [120, 7, 2, 1, 6]
+    #procedures called from the block see its dict
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        interpreter('/g {1 dict begin /z 1 def stack end} def 1 1 2 '
+            '{pop 5 dict begin /y 1 def g end} for', 'static')
+    return (any(op == OP and arg is endSlots for op, arg in ops) and
+        stacked and out.getvalue().count('/y     1') == 2 and
+        len(dictstack) == 1 and not slotFrames)
+
+def testOperatorRegistry():
+    import contextlib
+    import io
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    info = registry['add']
+    declared = (info.function is add and operators['add'] is add and
+        info.nops == 2 and info.pure and operatorNames[add] == 'add' and
+        not registry['put'].pure and registry['neg'].check([1]) and
+        not registry['neg'].check(['x']))
+    @psOp('sq', 1, (number,), True, lambda a: a * a)
+    def sq():
+        """Pop opstack and push the square."""
+        if opReady(1, sq.check):
+            opstack[-1] = opstack[-1] * opstack[-1]
+    try:
+        folded = optimize(parse(tokenize('3 sq 1 0 div')))
+        interpreter('3 sq true sq', 'static')
+    finally:
+        del registry['sq'], operators['sq'], operatorNames[sq]
+    squared = opstack == [9, True]
+    #copy checks its count like the other operators check their operands
+    opstack.clear()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        copy()
+        opPush('x')
+        copy()
+    return (declared and folded == [9, 1, 0, 'div'] and squared and
+        registry['copy'].nops == 1 and opstack == ['x'] and
+        out.getvalue() == 'error: not enough arguments on opstack\n'
+        'error: arguments of incorrect type\n')
+
+def testOperatorAllocations():
+    global opstack
+    opstack = [1, 2, 3, 2]
+    copy()
+    exch()
+    dup()
+    copied = opstack == [1, 2, 3, 3, 2, 2]
+    allocated = benchAllocations(['copy', 'dup', 'exch', 'add'], 100)
+    return copied and not any(allocated.values())
+
+def testShareProcedures():
+    global opstack
+    opstack.clear()
+    dictstack.clear()
+    a, b, c, d, e, f = parse(tokenize('{dup mul} {dup mul} {1 x} {true x} '
+        '{[1 2] x} {[1 2] x}'))
+    shared = (a is b and compileSPS(a, 'static') is compileSPS(b, 'static')
+        and c == d and c is not d and e == f and e is not f and
+        not procedures and not sharedIds)
+    interpreter('/sq {dup mul} def /f {3 true {dup mul} if} def 2 sq f',
+        'static')
+    return shared and opstack == [4, 9]
+
+def testNumStack():
+    global opstack
+    opstack = [7]
+    dictstack.clear()
+    interpreter('/sq {dup mul} def 3 sq 1 2 div 1 1 3 {add} for 2 3 lt '
+        '[1 2] 1 get', 'static', True)
+    st = NumStack([1, 2.5, True, 'x'])
+    st[-3] = 'y'
+    st[-1] = 4
+    return (type(opstack) is list and opstack == [7, 9, 6.5, True, 2] and
+        [type(x) for x in opstack] == [int, int, float, bool, int] and
+        st == [1, 'y', True, 4] and st.pop() == 4 and st.pop() is True)
+
+def testCompileCache():
+    proc = parse(tokenize('{/x exch def x x mul}'))[0]
+    code = compileSPS(proc, 'static')
+    plain = ['/x', 'exch', 'def', 'x', 'x', 'mul']
+    #plain lists can change, so their code is not kept
+    return (compileSPS(proc, 'static') is code and
+        derived(proc)['compiled'][('static', optLevel)] is code and
+        dictUse(code) == OWNDICT and code[-1] == (END, OWNDICT) and
+        derived(plain) is None and
+        compileSPS(plain, 'static') is not compileSPS(plain, 'static'))
+
+def testMemoize():
+    global opstack, memoSize
+    opstack = []
+    dictstack.clear()
+    memoSize = 100
+    try:
+        interpreter('/fib {dup 1 gt {dup 1 sub fib exch 2 sub fib add} if} '
+            'def /show {dup =} def 15 fib 15 fib', 'static')
+        hits, misses, rate = memoStats()
+        fib = procedureInfo(lookup('fib'))
+        show = procedureInfo(lookup('show'))
+    finally:
+        memoSize = None
+    return (opstack == [610, 610] and misses == 16 and hits == 15 and
+        fib.pure and fib.nops == 1 and fib.results == 1 and not show.pure)
+
 #------------------RUN TESTS-----------------------------------
 
 def main_part1():
@@ -1342,6 +4855,48 @@ def main_hw5():
         ('testSSPS static input 4', testSSPS7),
         ('testSSPS dynamic input 5', testSSPS8),
         ('testSSPS static input 5', testSSPS9),
+        ('deep recursion static', testDeepRecursion),
+        ('deep recursion dynamic', testDeepRecursion2),
+        ('inline control operators', testInlineControl),
+        ('tail call static', testTailCall),
+        ('tail call dynamic', testTailCall2),
+        ('tail call marked', testTailCall3),
+        ('transpiler', testTranspile),
+        ('transpiler disk cache', testTranspileCache),
+        ('transpiler fallback', testTranspileFallback),
+        ('trace hot loop', testTrace),
+        ('trace guard', testTraceGuard),
+        ('specialize operators', testSpecialize),
+        ('deoptimize operators', testDeoptimize),
+        ('unchecked operators', testUncheckedOps),
+        ('underflow warning', testUnderflowWarning),
+        ('stack caching', testStackCaching),
+        ('stack caching guard', testStackCachingGuard),
+        ('run call split', testRunCallSplit),
+        ('optimize', testOptimize),
+        ('optimize short stack', testOptimizeShortStack),
+        ('optimization level', testOptLevel),
+        ('superinstruction', testSuperinstruction),
+        ('profile opcodes', testProfileOpcodes),
+        ('inline calls', testInline),
+        ('inline shadowed calls', testInlineShadowed),
+        ('hoist loop invariants', testHoistLoop),
+        ('no hoisting with def', testHoistLoopDef),
+        ('parse types', testParseTypes),
+        ('put procedure', testPutProcedure),
+        ('symbols', testSymbols),
+        ('lookup tuples', testLookupTuples),
+        ('lexical address', testLexicalAddress),
+        ('shallow binding', testShallowBinding),
+        ('lookup cache', testLookupCache),
+        ('lazy frames', testLazyFrames),
+        ('slot block', testSlotBlock),
+        ('operator registry', testOperatorRegistry),
+        ('operator allocations', testOperatorAllocations),
+        ('share procedures', testShareProcedures),
+        ('num stack', testNumStack),
+        ('memoize', testMemoize),
+        ('compile cache', testCompileCache),
     ]
     # add you test functions to this list along with suitable names
     failedTests = [testName for (testName, testProc) in testCases if not testProc()]
@@ -1358,4 +4913,4 @@ def main_hw5():
 if __name__ == '__main__':
     #print(main_part2())
     #print(main_part1())
-    #print(main_hw5())
+    print(main_hw5())